@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+# Бенчмарк маршрутизации фраз (ModuleManager.tester) на синтетических модулях.
+# Работает без звука и сети: модули ничего не делают, только возвращают ответ.
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from modules_manager import ModuleManager, ModuleWrapper  # noqa
+from modules_manager import EQ, SW, EW, NM, ANY  # noqa
+from modules_manager import Next, Say  # noqa
+
+WORDS = [
+    'включи', 'выключи', 'свет', 'в', 'на', 'кухне', 'спальне', 'гостиной', 'коридоре', 'ванной', 'открой', 'закрой',
+    'шторы', 'окно', 'дверь', 'музыку', 'радио', 'погромче', 'потише', 'какая', 'погода', 'завтра', 'сегодня',
+    'температура', 'влажность', 'поставь', 'будильник', 'таймер', 'минут', 'часов', 'напомни', 'купить', 'хлеб',
+    'молоко', 'расскажи', 'про', 'новости', 'сколько', 'времени', 'чайник', 'кондиционер', 'пылесос', 'полив',
+    'сигнализацию', 'камеру', 'статус', 'режим', 'ночной', 'дневной', 'гостевой', 'котел', 'бойлер', 'вентиляцию',
+]
+PHRASES_PER_MODULE = 5
+
+
+class _Cfg(dict):
+    path = {}
+
+    @staticmethod
+    def load_dict(*_):
+        return None
+
+    @staticmethod
+    def save_dict(*_):
+        return True
+
+
+def _quiet(*_, **__):
+    pass
+
+
+class BenchManager(ModuleManager):
+    def __init__(self, registry):
+        super().__init__(log=(_quiet, _quiet), cfg=_Cfg(), die_in=_quiet, say=_quiet)
+        self._registry = registry
+
+    def _modules_load(self):
+        return self._registry
+
+
+def _phrase(rnd, min_len=1, max_len=3):
+    return ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(min_len, max_len)))
+
+
+def make_registry(rnd, count: int):
+    # count фраз в режимах EQ/SW/EW, в конце 2 модуля перехватывающие все
+    mod = ModuleWrapper()
+    phrases = []
+    modules = max(1, count // PHRASES_PER_MODULE)
+    for num in range(modules):
+        words = []
+        for _ in range(PHRASES_PER_MODULE):
+            phrase = _phrase(rnd)
+            mode_ = rnd.choice([EQ, SW, EW])
+            words.append([phrase, mode_])
+            phrases.append((phrase, mode_))
+        fall = rnd.random() < 0.2  # Часть модулей ошибается и отдает Next
+
+        def module(*_, fall_=fall):
+            return Next if fall_ else Say('Готово')
+        module.__name__ = 'synthetic_{}'.format(num)
+        mod.name(rnd.choice([NM, ANY]), 'модуль {}'.format(num), 'Синтетический модуль')(module)
+        mod.phrase(words)(module)
+
+    def majordomo(*_):
+        return None
+
+    def terminator(_, __, phrase):
+        return Say('Соответствие фразе не найдено: {}'.format(phrase))
+
+    mod.phrase('')(mod.name(NM, 'Мажордом', 'Отправку команд на сервер Мажордомо')(majordomo))
+    mod.phrase('')(mod.name(ANY, 'Терминатор', 'Информацию что соответствие фразе не найдено')(terminator))
+    return mod.get, phrases
+
+
+def make_utterances(rnd, phrases: list, count: int) -> list:
+    result = []
+    for _ in range(count):
+        kind = rnd.random()
+        if kind < 0.2:  # Ничего не совпало - уйдет в мажордом
+            result.append(_phrase(rnd, 2, 6).capitalize())
+            continue
+        phrase, mode_ = rnd.choice(phrases)
+        if mode_ == SW:
+            phrase = '{} {}'.format(phrase, _phrase(rnd, 0, 3)).strip()
+        elif mode_ == EW:
+            phrase = '{} {}'.format(_phrase(rnd, 0, 3), phrase).strip()
+        result.append(phrase.capitalize())
+    return result
+
+
+def percentile(data: list, pct: float):
+    return data[min(len(data) - 1, int(len(data) * pct / 100))]
+
+
+def bench(size: int, calls: int, alloc_calls: int, seed: int, debug: bool):
+    rnd = random.Random(seed)
+    registry, phrases = make_registry(rnd, size)
+    manager = BenchManager(registry)
+    start_time = time.perf_counter()
+    manager.start()
+    start_time = time.perf_counter() - start_time
+    manager._set_debug(debug)
+    utterances = make_utterances(rnd, phrases, calls)
+
+    for phrase in utterances[:100]:  # Прогрев
+        manager.tester(phrase)
+
+    latency = []
+    for phrase in utterances:
+        wtime = time.perf_counter()
+        manager.tester(phrase)
+        latency.append(time.perf_counter() - wtime)
+    latency.sort()
+
+    peaks = []
+    tracemalloc.start()
+    for phrase in utterances[:alloc_calls]:
+        tracemalloc.clear_traces()
+        manager.tester(phrase)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    peaks.sort()
+    manager.stop()
+
+    us = 1000000
+    return [
+        size, len(registry), '{:.1f}'.format(start_time * 1000),
+        '{:.1f}'.format(percentile(latency, 50) * us), '{:.1f}'.format(percentile(latency, 95) * us),
+        '{:.1f}'.format(percentile(latency, 99) * us), '{:.1f}'.format(latency[-1] * us),
+        percentile(peaks, 50) if peaks else 0, peaks[-1] if peaks else 0,
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк маршрутизации фраз ModuleManager.tester')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000], help='Количество фраз')
+    parser.add_argument('--calls', type=int, default=5000, help='Вызовов tester на каждый размер')
+    parser.add_argument('--alloc-calls', type=int, default=500, help='Вызовов для замера аллокаций')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--debug', action='store_true', help='Режим разработчика')
+    args = parser.parse_args()
+
+    head = ['phrases', 'modules', 'start ms', 'p50 us', 'p95 us', 'p99 us', 'max us', 'alloc p50 B', 'alloc max B']
+    rows = [head] + [[str(x) for x in bench(size, args.calls, args.alloc_calls, args.seed, args.debug)]
+                     for size in args.sizes]
+    widths = [max(len(row[idx]) for row in rows) for idx in range(len(head))]
+    for row in rows:
+        print('  '.join(val.rjust(widths[idx]) for idx, val in enumerate(row)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+# Бенчмарк раскладки tts кэша: плоская <провайдер>_<sha1>.mp3 против шардов <провайдер>/<голос>/<ab>/<sha1>.mp3.
+# Меряет поиск файла (stat, как делал старый кэш) и создание нового файла.
+# Результат зависит от ФС, запускайте с --dir на той карте где живет кэш.
+
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from tts_cache import TTSCache  # noqa
+
+PROVIDERS = ['google', 'yandex']
+VOICE = TTSCache.voice_name('alyss', 'good', 'ru-RU', 'mp3')
+DATA = b'\0' * 1024
+
+
+def _sha1(num: int) -> str:
+    return hashlib.sha1(str(num).encode()).hexdigest()
+
+
+def _create(path_fn, root: str, num: int, shards: set):
+    prov = PROVIDERS[num % len(PROVIDERS)]
+    file = path_fn(root, _sha1(num), prov)
+    shard = os.path.dirname(file)
+    if shard not in shards:  # Как и TTSCache, помним созданные директории
+        os.makedirs(shard, exist_ok=True)
+        shards.add(shard)
+    with open(file, 'wb') as fp:
+        fp.write(DATA)
+
+
+def percentile(data: list, pct: float):
+    return data[min(len(data) - 1, int(len(data) * pct / 100))]
+
+
+def bench(layout: str, size: int, calls: int, base: str, seed: int):
+    rnd = random.Random(seed)
+    if layout == 'flat':
+        path_fn = TTSCache.flat_path
+    else:
+        def path_fn(*args):
+            return TTSCache.shard_path(*args, VOICE)
+    root = tempfile.mkdtemp(prefix='tts_cache_{}_'.format(layout), dir=base)
+    shards = set()
+    try:
+        fill_time = time.perf_counter()
+        for num in range(size):
+            _create(path_fn, root, num, shards)
+        fill_time = time.perf_counter() - fill_time
+
+        lookup = []
+        for _ in range(calls):
+            num = rnd.randrange(size * 2)  # Половина промахов
+            file = path_fn(root, _sha1(num), PROVIDERS[num % len(PROVIDERS)])
+            wtime = time.perf_counter()
+            os.path.isfile(file)
+            lookup.append(time.perf_counter() - wtime)
+        lookup.sort()
+
+        create = []
+        for num in range(size * 2, size * 2 + calls):
+            wtime = time.perf_counter()
+            _create(path_fn, root, num, shards)
+            create.append(time.perf_counter() - wtime)
+        create.sort()
+    finally:
+        shutil.rmtree(root)
+
+    us = 1000000
+    return [
+        layout, size, '{:.1f}'.format(fill_time),
+        *['{:.1f}'.format(percentile(lookup, pct) * us) for pct in [50, 95, 99]],
+        *['{:.1f}'.format(percentile(create, pct) * us) for pct in [50, 95, 99]],
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк раскладки tts кэша')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Файлов в кэше')
+    parser.add_argument('--calls', type=int, default=2000, help='Поисков и созданий на каждый размер')
+    parser.add_argument('--dir', default=None, help='Где создавать временный кэш')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    head = ['layout', 'files', 'fill s', 'find p50 us', 'find p95 us', 'find p99 us',
+            'create p50 us', 'create p95 us', 'create p99 us']
+    rows = [head]
+    for size in args.sizes:
+        for layout in ['flat', 'sharded']:
+            rows.append([str(x) for x in bench(layout, size, args.calls, args.dir, args.seed)])
+    widths = [max(len(row[idx]) for row in rows) for idx in range(len(head))]
+    for row in rows:
+        print('  '.join(val.rjust(widths[idx]) for idx, val in enumerate(row)))
+
+
+if __name__ == '__main__':
+    main()
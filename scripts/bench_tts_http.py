@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+# Бенчмарк time-to-first-byte запросов к tts провайдеру: новое соединение на каждый запрос (как было)
+# против общей keep-alive сессии из lib.http_session.
+# По умолчанию поднимает локальную заглушку, экономия на TLS рукопожатии здесь не видна.
+# Для реального сервера используйте --url, например http://127.0.0.1:8080/say?text=привет
+
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from lib import http_session  # noqa
+
+DATA = b'\xff\xfb' * 8192
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело одной записью, иначе на keep-alive вмешивается Nagle с отложенным ACK
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', str(len(DATA)))
+        self.end_headers()
+        self.wfile.write(DATA)
+
+    def log_message(self, *_):
+        pass
+
+
+def percentile(data: list, pct: float):
+    return data[min(len(data) - 1, int(len(data) * pct / 100))]
+
+
+def _ttfb(get, url: str) -> float:
+    wtime = time.perf_counter()
+    rq = get(url, stream=True, timeout=30)
+    try:
+        rq.raise_for_status()
+        chunks = rq.iter_content(4096)
+        next(chunks)
+        result = time.perf_counter() - wtime
+        for _ in chunks:
+            pass
+    finally:
+        rq.close()
+    return result
+
+
+def bench(mode: str, url: str, calls: int):
+    if mode == 'new':
+        get = requests.get
+    else:
+        http_session.close()
+
+        def get(*args, **kwargs):
+            return http_session.get(url).get(*args, **kwargs)
+    times = sorted(_ttfb(get, url) for _ in range(calls))
+    ms = 1000
+    return [
+        mode, calls, '{:.1f}'.format(sum(times) * ms),
+        *['{:.2f}'.format(percentile(times, pct) * ms) for pct in [50, 95, 99]],
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк HTTP сессий tts провайдеров')
+    parser.add_argument('--calls', type=int, default=500, help='Запросов на каждый режим')
+    parser.add_argument('--url', default=None, help='Адрес реального сервера вместо заглушки')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:{}/say?text=test'.format(server.server_address[1])
+    try:
+        head = ['mode', 'calls', 'total ms', 'ttfb p50 ms', 'ttfb p95 ms', 'ttfb p99 ms']
+        rows = [head]
+        for mode in ['new', 'session']:
+            rows.append([str(x) for x in bench(mode, url, args.calls)])
+    finally:
+        http_session.close()
+        if server is not None:
+            server.shutdown()
+    widths = [max(len(row[idx]) for row in rows) for idx in range(len(head))]
+    for row in rows:
+        print('  '.join(val.rjust(widths[idx]) for idx, val in enumerate(row)))
+
+
+if __name__ == '__main__':
+    main()
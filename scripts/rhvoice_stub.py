@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+# Заглушка постоянного процесса RHVoice, говорит по протоколу lib/rhvoice_worker.py.
+# Вместо речи отдает тишину, 50 ms на символ. Укажите в settings.ini:
+# [rhvoice]
+# worker = python3 /path/to/scripts/rhvoice_stub.py --load 2
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from lib.rhvoice_worker import BUFF_SIZE, read_frame, write_frame  # noqa
+
+RATE = 24000
+
+
+def _wav(text: str) -> bytes:
+    buff = io.BytesIO()
+    with wave.open(buff, 'wb') as fp:
+        fp.setnchannels(1)
+        fp.setsampwidth(2)
+        fp.setframerate(RATE)
+        fp.writeframes(b'\0\0' * (RATE // 20) * len(text))
+    return buff.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заглушка RHVoice worker')
+    parser.add_argument('--load', type=float, default=0, help='Секунд на "загрузку голосов" при старте')
+    parser.add_argument('--delay', type=float, default=0, help='Секунд до первого куска каждой фразы')
+    parser.add_argument('--crash-after', type=int, default=0, help='Упасть после N фраз, 0 - никогда')
+    parser.add_argument('--fail-start', action='store_true', help='Не запускаться')
+    args = parser.parse_args()
+
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    time.sleep(args.load)
+    if args.fail_start:
+        write_frame(stdout, b'E', b'stub: fail start')
+        return
+    write_frame(stdout, b'R')
+    served = 0
+    while True:
+        try:
+            kind, data = read_frame(stdin)
+        except EOFError:
+            break
+        request = json.loads(data.decode())
+        if args.crash_after and served >= args.crash_after:
+            sys.exit(1)
+        served += 1
+        if request['format'] != 'wav' or request['voice'] == 'error':
+            write_frame(stdout, b'E', 'stub: unsupported {format} {voice}'.format(**request).encode())
+            continue
+        time.sleep(args.delay)
+        data = _wav(request['text'])
+        for idx in range(0, len(data), BUFF_SIZE):
+            write_frame(stdout, b'D', data[idx:idx + BUFF_SIZE])
+        write_frame(stdout, b'F')
+
+
+if __name__ == '__main__':
+    main()
@@ -13,17 +13,25 @@ class TestShell(cmd__.Cmd):
         self._ip = '127.0.0.1'
         self._port = 7999
 
-    def _send(self, cmd: str):
+    def _send(self, cmd: str, reply=False):
         client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         client.settimeout(3)
         print('Отправляю {}:{} \'{}\'...'.format(self._ip, self._port, cmd))
         try:
             client.connect((self._ip, self._port))
             client.send(cmd.encode() + b'\r\n')
+            data = b''
+            while reply and b'\r\n' not in data:
+                tmp = client.recv(4096)
+                if not tmp:
+                    break
+                data += tmp
         except (BrokenPipeError, ConnectionResetError, ConnectionRefusedError, OSError) as err:
             print('Ошибка подключения к {}:{}. {}: {}'.format(self._ip, self._port, err.errno, err.strerror))
         else:
             print('...Успех.')
+            if reply:
+                print(data.decode().strip())
         finally:
             client.close()
 
@@ -76,6 +84,10 @@ class TestShell(cmd__.Cmd):
         """Отправляет pause:."""
         self._send('pause:')
 
+    def do_stats(self, _):
+        """Запрашивает статистику модулей"""
+        self._send('stats:', True)
+
     def do_save(self, _):
         """Отправляет команду на перезагрузку"""
         self._send('rec:save_1_1')
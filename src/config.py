@@ -12,6 +12,7 @@ from lib import yandex_apikey
 
 class ConfigHandler(dict):
     SETTINGS = 'Settings'
+    YANDEX_KEY = 'yandex_apikey'
 
     def __init__(self, cfg: dict, path: dict):
         super().__init__()
@@ -28,13 +29,20 @@ class ConfigHandler(dict):
         if prov == 'yandex' and not key_:
             # Будем брать ключ у транслита
             if self._yandex is None:
-                self._yandex = yandex_apikey.APIKey()
+                self._yandex = yandex_apikey.APIKey(
+                    load=lambda: self.load_dict(self.YANDEX_KEY),
+                    save=lambda data: self.save_dict(self.YANDEX_KEY, data)
+                )
             try:
                 key_ = self._yandex.key
             except RuntimeError as e:
                 self._log('Ошибка получения ключа для Yandex: {}'.format(e), logger.ERROR)
         return key_
 
+    def key_stats(self) -> dict:
+        # Пусто, если ключ у транслита еще не брали
+        return self._yandex.stats() if self._yandex is not None else {}
+
     def get_uint(self, key: str, default=0) -> int:
         try:
             result = int(self.get(key, default))
@@ -61,7 +69,6 @@ class ConfigHandler(dict):
         self._lost_file(self.path['tts_error'])
 
         self.models_load()
-        self.tts_cache_check()
 
     def allow_connect(self, ip: str) -> bool:
         if not self['ip_server'] and self['first_love']:
@@ -248,43 +255,6 @@ class ConfigHandler(dict):
                 is_change |= self._key_parse(key, val, self)
         return is_change
 
-    def tts_cache_check(self):
-        if not os.path.isdir(self.path['tts_cache']):
-            self._print(msg='Директория c tts кэшем не найдена {}'.format(self.path['tts_cache']), mode=3)
-            return
-        max_size = self['cache'].get('tts_size', 50) * 1024 * 1024
-        current_size = 0
-        files = []
-        # Формируем список из пути и размера файлов, заодно считаем общий размер.
-        for file in os.listdir(self.path['tts_cache']):
-            pfile = os.path.join(self.path['tts_cache'], file)
-            if os.path.isfile(pfile):
-                fsize = os.path.getsize(pfile)
-                current_size += fsize
-                files.append([pfile, fsize])
-        normal_size = not files or current_size < max_size or max_size < 0
-        self._print(
-            'Размер tts кэша {}: {}'.format(utils.pretty_size(current_size), 'Ок.' if normal_size else 'Удаляем...'),
-            logger.INFO, 1 if normal_size else 3)
-        if normal_size:
-            return
-
-        new_size = int(max_size * 0.7)
-        deleted_files = 0
-        # Сортируем файлы по дате последнего доступа
-        files.sort(key=lambda x: os.path.getatime(x[0]))
-        for file in files:
-            if current_size <= new_size:
-                break
-            current_size -= file[1]
-            self._print('Удаляю {}'.format(file[0]))
-            os.remove(file[0])
-            deleted_files += 1
-
-        self._print('Удалено {} файлов. Новый размер TTS кэша {}.'.format(
-            deleted_files, utils.pretty_size(current_size)), logger.INFO, 3
-        )
-
     def _make_dir(self, path: str):
         if not os.path.isdir(path):
             self._print('Директория {} не найдена. Создаю...'.format(path), logger.INFO)
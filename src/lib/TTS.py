@@ -2,10 +2,10 @@
 import subprocess
 from shlex import quote
 
-import requests
 from bs4 import BeautifulSoup
 
 from utils import REQUEST_ERRORS
+from . import http_session, rhvoice_worker
 from .stream_gTTS import gTTS as Google
 
 __all__ = ['support', 'GetTTS', 'Google', 'Yandex', 'RHVoiceREST', 'RHVoice']
@@ -30,7 +30,7 @@ class BaseTTS:
 
     def _request(self):
         try:
-            self._rq = requests.get(self._url, params=self._params, stream=True, timeout=30)
+            self._rq = http_session.get(self._url).get(self._url, params=self._params, stream=True, timeout=30)
         except REQUEST_ERRORS as e:
             raise RuntimeError(str(e))
         self._data = self._rq.iter_content
@@ -48,6 +48,8 @@ class BaseTTS:
                 yield chunk
         except REQUEST_ERRORS as e:
             raise RuntimeError(e)
+        finally:
+            self._rq.close()  # Соединение вернется в пул
 
     def stream_to_fps(self, fps):
         if not isinstance(fps, list):
@@ -83,12 +85,21 @@ class RHVoiceREST(BaseTTS):
 
 
 class RHVoice(RHVoiceREST):
+    # Синтез в постоянном процессе lib/rhvoice_worker.py, если он не запускается - shell конвейер на каждую фразу
     CMD = {
         'mp3': 'echo {} | RHVoice-test -p {} -o - | lame -ht -V 4 - -',
         'wav': 'echo {} | RHVoice-test -p {} -o -'
     }
 
     def _request(self):
+        self._rq = None
+        self._data = rhvoice_worker.say(self._params['text'], self._params['voice'], self._params['format'])
+        if self._data is not None:
+            try:
+                self.__test = next(self._data, b'')  # Ошибки синтеза вылетят здесь
+                return
+            except rhvoice_worker.StartError:
+                pass
         self._rq = subprocess.Popen(
             self.CMD[self._params['format']].format(quote(self._params['text']), self._params['voice']),
             stdout=subprocess.PIPE,
@@ -99,19 +110,31 @@ class RHVoice(RHVoiceREST):
         self.__test = self._data.read(self.BUFF_SIZE)  # Ждем запуска, иначе poll() не вернет ошибку
 
     def _reply_check(self):
-        if self._rq.poll():
+        if self._rq is not None and self._rq.poll():
             raise RuntimeError('{}: {}'.format(self._rq.poll(), ' '.join(self._rq.stderr.read().decode().split())[:99]))
 
     def iter_me(self):
         if self._data is None:
             raise RuntimeError('No data')
-        if self.__test:
-            yield self.__test
-        while True:
-            chunk = self._data.read(self.BUFF_SIZE)
-            if not chunk:
-                break
-            yield chunk
+        if self._rq is None:
+            if self.__test:
+                yield self.__test
+            yield from self._data
+            return
+        try:
+            if self.__test:
+                yield self.__test
+            while True:
+                chunk = self._data.read(self.BUFF_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            # Брошенный на середине синтез получит SIGPIPE
+            self._data.close()
+            if self._rq.poll() is None:
+                self._rq.kill()
+            self._rq.wait()
 
 
 _CLASS_BY_NAME = {'google': Google, 'yandex': Yandex, 'rhvoice-rest': RHVoiceREST, 'rhvoice': RHVoice}
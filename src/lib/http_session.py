@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+# Общие keep-alive сессии для провайдеров, по одной на схему и хост.
+# Сессия без запросов дольше KEEP_ALIVE пересоздается, чтобы не брать соединения которые сервер уже закрыл
+POOL_SIZE = 4
+KEEP_ALIVE = 60
+
+_lock = threading.Lock()
+_sessions = {}  # {'https://host': [сессия, время последнего запроса]}
+
+
+def configure(pool_size: int, keep_alive: int):
+    global POOL_SIZE, KEEP_ALIVE
+    pool_size, keep_alive = max(1, pool_size), max(0, keep_alive)
+    with _lock:
+        if pool_size != POOL_SIZE:
+            _close()
+        POOL_SIZE, KEEP_ALIVE = pool_size, keep_alive
+
+
+def get(url: str) -> requests.Session:
+    parts = urlsplit(url)
+    key = '{}://{}'.format(parts.scheme, parts.netloc)
+    now = time.time()
+    with _lock:
+        entry = _sessions.get(key)
+        if entry is not None and now - entry[1] > KEEP_ALIVE:
+            entry[0].close()
+            entry = None
+        if entry is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            entry = _sessions[key] = [session, now]
+        entry[1] = now
+        return entry[0]
+
+
+def close():
+    with _lock:
+        _close()
+
+
+def _close():
+    for session, _ in _sessions.values():
+        session.close()
+    _sessions.clear()
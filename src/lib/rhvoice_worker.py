@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+# Постоянный процесс синтеза RHVoice: голоса грузятся один раз, фразы идут по stdin/stdout.
+# Кадр: тип (1 байт) + длина (4 байта, big-endian) + данные.
+# Запрос: S + json {text, voice, format}. Ответ: D + кусок звука, ..., F - конец или E + текст ошибки.
+# После запуска процесс пишет R - готов, или E + причина.
+# Запущенный как скрипт, этот файл и есть процесс, на rhvoice-wrapper. Можно указать любую программу с тем же
+# протоколом (rhvoice.worker в настройках), например заглушку для тестов.
+
+import json
+import os
+import shlex
+import struct
+import subprocess
+import sys
+import threading
+
+HEAD = struct.Struct('>cI')
+RESTARTS = 3  # Неудачных запусков подряд, потом синтез идет по-старому, через RHVoice-test
+BUFF_SIZE = 1024 * 4
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+class StartError(WorkerError):
+    pass
+
+
+def write_frame(fp, kind: bytes, data: bytes = b''):
+    fp.write(HEAD.pack(kind, len(data)) + data)
+    fp.flush()
+
+
+def read_frame(fp) -> tuple:
+    kind, size = HEAD.unpack(_read(fp, HEAD.size))
+    return kind, _read(fp, size)
+
+
+def _read(fp, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = fp.read(size - len(data))
+        if not chunk:
+            raise EOFError('Worker closed the pipe')
+        data += chunk
+    return data
+
+
+class Worker:
+    def __init__(self, cmd: list):
+        self._cmd = cmd
+        self._lock = threading.Lock()
+        self._popen = None
+        self._fails = 0
+        self.broken = False
+
+    def say(self, text: str, voice: str, format_: str):
+        # Генератор кусков звука или None, если процесс так и не запустился
+        if self.broken:
+            return None
+        return self._say(json.dumps({'text': text, 'voice': voice, 'format': format_}).encode())
+
+    def stop(self):
+        with self._lock:
+            self._kill()
+
+    def _say(self, request: bytes):
+        with self._lock:
+            for attempt in range(2):  # Процесс мог упасть после прошлой фразы, перезапустим один раз
+                self._start()
+                try:
+                    write_frame(self._popen.stdin, b'S', request)
+                    kind, data = read_frame(self._popen.stdout)
+                except (OSError, EOFError) as e:
+                    self._kill()
+                    if attempt:
+                        raise WorkerError('RHVoice worker: {}'.format(e))
+                    continue
+                break
+            try:
+                while kind == b'D':
+                    yield data
+                    kind, data = read_frame(self._popen.stdout)
+            except (OSError, EOFError) as e:
+                self._kill()
+                raise WorkerError('RHVoice worker: {}'.format(e))
+            except GeneratorExit:
+                self._drain()
+                raise
+            if kind == b'E':
+                raise WorkerError(data.decode(errors='replace'))
+
+    def _drain(self):
+        # Фразу бросили на середине, дочитываем ответ чтобы не сбить протокол
+        try:
+            while read_frame(self._popen.stdout)[0] == b'D':
+                pass
+        except (OSError, EOFError):
+            self._kill()
+
+    def _start(self):
+        if self._popen is not None and self._popen.poll() is None:
+            return
+        self._kill()
+        try:
+            self._popen = subprocess.Popen(
+                self._cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+            kind, data = read_frame(self._popen.stdout)
+        except (OSError, EOFError) as e:
+            kind, data = b'E', str(e).encode()
+        if kind == b'R':
+            self._fails = 0
+            return
+        self._kill()
+        self._fails += 1
+        if self._fails >= RESTARTS:
+            self.broken = True
+        raise StartError('RHVoice worker not started: {}'.format(data.decode(errors='replace')))
+
+    def _kill(self):
+        if self._popen is None:
+            return
+        try:
+            self._popen.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._popen.wait(1)
+        except subprocess.TimeoutExpired:
+            self._popen.kill()
+            self._popen.wait()
+        self._popen.stdout.close()
+        self._popen = None
+
+
+_lock = threading.Lock()
+_worker = None
+_cmd = [sys.executable, os.path.abspath(__file__)]
+
+
+def configure(cmd: str):
+    # Пустая строка - встроенный процесс на rhvoice-wrapper
+    global _cmd
+    cmd = shlex.split(cmd) if cmd else [sys.executable, os.path.abspath(__file__)]
+    with _lock:
+        if cmd != _cmd:
+            _stop()
+        _cmd = cmd
+
+
+def say(text: str, voice: str, format_: str):
+    global _worker
+    with _lock:
+        if _worker is None:
+            _worker = Worker(_cmd)
+        worker = _worker
+    return worker.say(text, voice, format_)
+
+
+def stop():
+    with _lock:
+        _stop()
+
+
+def _stop():
+    global _worker
+    if _worker is not None:
+        _worker.stop()
+        _worker = None
+
+
+def serve():
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    sys.stdout = sys.stderr  # Случайный print не сломает протокол
+    try:
+        from rhvoice_wrapper import TTS
+        tts = TTS(threads=1, quiet=True)
+    except Exception as e:
+        write_frame(stdout, b'E', str(e).encode())
+        return
+    write_frame(stdout, b'R')
+    while True:
+        try:
+            kind, data = read_frame(stdin)
+        except EOFError:
+            break
+        if kind != b'S':
+            continue
+        try:
+            request = json.loads(data.decode())
+            if request['format'] not in tts.formats:
+                raise RuntimeError('Unsupported format: {}'.format(request['format']))
+            with tts.say(request['text'], voice=request['voice'], format_=request['format'], buff=BUFF_SIZE) as gen:
+                for chunk in gen:
+                    write_frame(stdout, b'D', chunk)
+        except Exception as e:
+            write_frame(stdout, b'E', str(e).encode())
+        else:
+            write_frame(stdout, b'F')
+    tts.join()
+
+
+if __name__ == '__main__':
+    serve()
@@ -1,58 +1,113 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import gtts
-import requests
 import urllib3
 # noinspection PyProtectedMember
 from gtts.utils import _len
+from gtts_token.gtts_token import Token
 from six.moves import urllib
 
+from utils import REQUEST_ERRORS
+from . import http_session
+
+# Первая часть текста сразу идет в плеер, следующие качаются параллельно через общий пул соединений.
+# Пул потоков один на все фразы, больше PARALLEL запросов частей одновременно не будет
+PARALLEL = 3
+TOKEN_TTL = 30 * 60  # Ключ для токенов берется со страницы переводчика, не чаще
+
+_lock = threading.Lock()
+_token = None  # [Token, время создания]
+_langs = set()  # Уже проверенные языки, tts_langs() каждый раз ходит в сеть
+_pool = ThreadPoolExecutor(max_workers=PARALLEL, thread_name_prefix='gTTSPart')
+
+
+def _calculate_token(part: str) -> str:
+    global _token
+    with _lock:
+        if _token is None or time.time() - _token[1] > TOKEN_TTL:
+            _token = [Token(), time.time()]
+        return _token[0].calculate_token(part)
+
 
 class gTTS(gtts.gTTS):
+    TIMEOUT = 30
+
     def __init__(self, text, lang, *_, **__):
-        super().__init__(text=text, lang=lang)
+        super().__init__(text=text, lang=lang, lang_check=lang not in _langs)
+        _langs.add(lang)
 
     def stream_to_fps(self, fps):
         if not isinstance(fps, list):
             fps = [fps]
+        for chunk in self.iter_me():
+            for f in fps:
+                f.write(chunk)
+
+    def iter_me(self):
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
         text_parts = self._tokenize(self.text)
         assert text_parts, 'No text to send to TTS API'
-        for idx, part in enumerate(text_parts):
-            try:
-                # Calculate token
-                part_tk = self.token.calculate_token(part)
-            except requests.exceptions.RequestException as e:  # pragma: no cover
-                raise gtts.gTTSError(
-                    "Connection error during token calculation: %s" %
-                    str(e))
-
-            payload = {'ie': 'UTF-8',
-                       'q': part,
-                       'tl': self.lang,
-                       'ttsspeed': self.speed,
-                       'total': len(text_parts),
-                       'idx': idx,
-                       'client': 'tw-ob',
-                       'textlen': _len(part),
-                       'tk': part_tk}
-            r = None
+        futures = []
+        try:
+            payloads = [self._payload(idx, part, len(text_parts)) for idx, part in enumerate(text_parts)]
+            futures = [_pool.submit(self._fetch, payload) for payload in payloads[1:]]
+            r = self._request(payloads[0])
             try:
-                # Request
-                r = requests.get(self.GOOGLE_TTS_URL,
-                                 params=payload,
-                                 headers=self.GOOGLE_TTS_HEADERS,
-                                 proxies=urllib.request.getproxies(),
-                                 verify=False,
-                                 stream=True)
-
-                r.raise_for_status()
-            except requests.exceptions.HTTPError:
+                for chunk in r.iter_content(chunk_size=1024):
+                    yield chunk
+            finally:
+                r.close()  # Соединение вернется в пул
+            for future in futures:
+                yield future.result()
+        except (gtts.gTTSError, ValueError) as e:
+            raise RuntimeError(str(e))
+        except REQUEST_ERRORS as e:
+            raise RuntimeError(str(e))
+        finally:
+            for future in futures:  # Фразу бросили, еще не начатые части не нужны
+                future.cancel()
+
+    def _payload(self, idx: int, part: str, total: int) -> dict:
+        try:
+            part_tk = _calculate_token(part)
+        except REQUEST_ERRORS as e:
+            raise gtts.gTTSError('Connection error during token calculation: {}'.format(e))
+        return {'ie': 'UTF-8',
+                'q': part,
+                'tl': self.lang,
+                'ttsspeed': self.speed,
+                'total': total,
+                'idx': idx,
+                'client': 'tw-ob',
+                'textlen': _len(part),
+                'tk': part_tk}
+
+    def _request(self, payload: dict):
+        r = None
+        try:
+            r = http_session.get(self.GOOGLE_TTS_URL).get(self.GOOGLE_TTS_URL,
+                                                          params=payload,
+                                                          headers=self.GOOGLE_TTS_HEADERS,
+                                                          proxies=urllib.request.getproxies(),
+                                                          verify=False,
+                                                          stream=True,
+                                                          timeout=self.TIMEOUT)
+            r.raise_for_status()
+        except REQUEST_ERRORS as e:
+            if r is not None and r.status_code >= 400:
                 # Request successful, bad response
+                r.close()
                 raise gtts.gTTSError(tts=self, response=r)
-            except requests.exceptions.RequestException as e:  # pragma: no cover
-                # Request failed
-                raise gtts.gTTSError(str(e))
-            for chunk in r.iter_content(chunk_size=1024):
-                for f in fps:
-                    f.write(chunk)
+            # Request failed
+            raise gtts.gTTSError(str(e))
+        return r
+
+    def _fetch(self, payload: dict) -> bytes:
+        r = self._request(payload)
+        try:
+            return r.content
+        finally:
+            r.close()
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import threading
 import time
 
 import requests
@@ -8,26 +9,98 @@ from utils import REQUEST_ERRORS
 
 
 class APIKey:
+    # Ключ обновляется в фоне заранее, до протухания, и переживает перезапуск через save/load.
+    # Синхронно за ключом идем только если его нет или он протух, а фон не справился.
+    # Если ключ долго не спрашивали, фон засыпает до следующего запроса
     URL = 'https://translate.yandex.ru'
     TARGET = 'SPEECHKIT_KEY:'
     LIFE_TIME = 5 * 60
+    REFRESH_IN = 4 * 60  # Возраст ключа, когда фон его обновит
+    RETRY = 30  # Пауза после неудачи
+    IDLE = 30 * 60  # Сколько обновлять ключ, который никто не спрашивает
 
-    def __init__(self):
+    def __init__(self, load=None, save=None):
+        # load() -> {'key', 'time'} или None, save(dict) - хранилище между перезапусками
+        self._save = save
+        self._lock = threading.Lock()  # Одно получение ключа за раз
+        self._thread_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._used = time.time()
         self._api_key = None
         self._get_time = 0
+        self._stats = {'fetches': 0, 'failures': 0, 'sync': 0, 'latency_sum': 0, 'latency_max': 0, 'error': ''}
+        data = load() if load else None
+        if isinstance(data, dict) and isinstance(data.get('key'), str) and isinstance(data.get('time'), (int, float)):
+            self._api_key, self._get_time = data['key'], data['time']
 
     @property
     def key(self):
+        self._used = time.time()
+        self._refresher()
         if not self._api_key or self._rotten():
-            self._extract()
+            with self._lock:
+                if not self._api_key or self._rotten():  # Пока ждали, мог обновить фон
+                    self._stats['sync'] += 1
+                    self._fetch()
         return self._api_key
 
+    def stats(self) -> dict:
+        stats = self._stats.copy()
+        fetches = stats.pop('fetches')
+        latency = stats.pop('latency_sum')
+        stats.update({
+            'fetches': fetches,
+            'latency_avg': round(latency / fetches, 3) if fetches else 0,
+            'latency_max': round(stats['latency_max'], 3),
+            'age': round(time.time() - self._get_time) if self._api_key else None,
+        })
+        return stats
+
     def _rotten(self):
-        return time.perf_counter() > self._get_time + self.LIFE_TIME
+        return time.time() > self._get_time + self.LIFE_TIME
+
+    def _refresher(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='YandexKey', daemon=True)
+                self._thread.start()
 
-    def _extract(self):
+    def _run(self):
+        while time.time() - self._used < self.IDLE:
+            wait = self._get_time + self.REFRESH_IN - time.time() if self._api_key else 0
+            if wait <= 0:
+                with self._lock:
+                    try:
+                        self._fetch()
+                    except RuntimeError:
+                        wait = self.RETRY
+                    else:
+                        continue
+            self._wakeup.wait(wait)
+
+    def _fetch(self):
+        # Вызывать под локом
+        wtime = time.time()
+        self._stats['fetches'] += 1
         try:
-            response = requests.get(self.URL)
+            key = self._extract()
+        except RuntimeError as e:
+            self._stats['failures'] += 1
+            self._stats['error'] = str(e)
+            raise
+        finally:
+            latency = time.time() - wtime
+            self._stats['latency_sum'] += latency
+            self._stats['latency_max'] = max(self._stats['latency_max'], latency)
+        self._api_key, self._get_time = key, time.time()
+        self._stats['error'] = ''
+        if self._save:
+            self._save({'key': self._api_key, 'time': self._get_time})
+
+    def _extract(self) -> str:
+        try:
+            response = requests.get(self.URL, timeout=30)
         except REQUEST_ERRORS as e:
             raise RuntimeError(str(e))
         line = response.text
@@ -39,14 +112,10 @@ class APIKey:
             end = line.find(',', start)
         if start and end and start < end:
             result = line[start:end].strip(' \'')
-        if result:
-            self._get_time = time.perf_counter()
-        else:
+        if not result:
             raise RuntimeError('API Key not extracted. Yandex change page?')
-
-        self._api_key = result
+        return result
 
 
 if __name__ == '__main__':
     print(APIKey().key)
-
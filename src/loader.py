@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 
+import inspect
+
 import stts
+import utils
 from config import ConfigHandler
 from logger import Logger
 from modules_manager import ModuleManager
@@ -19,7 +22,8 @@ class Loader:
         self._logger = Logger(self._cfg['log'])
         self._cfg.configure(self._logger.add('CFG'))
 
-        self._tts = stts.TextToSpeech(cfg=self._cfg, log=self._logger.add('TTS')).tts
+        self._speech = stts.TextToSpeech(cfg=self._cfg, log=self._logger.add('TTS'))
+        self._tts = self._speech.tts
 
         self._play = Player(cfg=self._cfg, log=self._logger.add('Player'), tts=self._tts)
 
@@ -38,7 +42,7 @@ class Loader:
 
         self._server = MDTServer(
             cfg=self._cfg, log=self._logger.add('Server'),
-            play=self._play, terminal=self._terminal, die_in=self.die_in, stt=self._stt
+            play=self._play, terminal=self._terminal, die_in=self.die_in, stt=self._stt, stats=self.stats
         )
 
     def start(self):
@@ -57,9 +61,11 @@ class Loader:
         self._mm.start()
         self._terminal.start()
         self._server.start()
+        self._speech.prewarm(self.phrases())
 
     def stop(self):
         self._mm.save()
+        self._mm.stop()
         self._server.join()
         self._terminal.join()
 
@@ -69,9 +75,21 @@ class Loader:
 
         self._stt.stop()
         self._play.stop()
+        self._speech.stop()
         self._mpd.join()
         self._logger.join()
 
+    def phrases(self) -> list:
+        # Все неизменные фразы терминала
+        stt = stts.SpeechToText
+        result = stt.HELLO + stt.DEAF + [stt.ASK_AGAIN]
+        for obj in [Loader, MDTServer, stts, MDTerminal, Player]:
+            result.extend(utils.say_literals(inspect.getfile(obj)))
+        return result + self._mm.phrases() + stts.TextToSpeech.LEXICON
+
+    def stats(self) -> dict:
+        return {'modules': self._mm.stats(), 'tts': self._speech.stats(), 'yandex_key': self._cfg.key_stats()}
+
     def die_in(self, wait, reload=False):
         self.reload = reload
         self._die_in(wait)
@@ -46,6 +46,7 @@ CFG = {  # Дефолтные настройки https://github.com/Aculeasis/md
     },
     'rhvoice': {
         'speaker': 'anna',
+        'worker': '',  # Команда постоянного процесса синтеза. Пусто - встроенный, на rhvoice-wrapper
     },
     'pocketsphinx-rest': {
         'server': 'http://127.0.0.1:8085',
@@ -54,6 +55,14 @@ CFG = {  # Дефолтные настройки https://github.com/Aculeasis/md
         'tts_priority': 'yandex',
         'tts_size': 100,
     },
+    'tts': {
+        'http_pool': 4,  # Соединений на провайдера
+        'keep_alive': 60,  # Сколько секунд держать простаивающие соединения
+        'hedge': '',  # Запасной провайдер, если основной не ответил вовремя. Пусто - выключено
+        'hedge_after': 1.5,  # Сколько секунд ждать первый звук от основного
+        # Нормализация фраз перед кэшем и синтезом: space, punct, case, yo. Можно задать и в секции провайдера
+        'normalize': 'space,punct',
+    },
     'models': {},
 }
 
@@ -72,6 +81,8 @@ def get_path(home) -> dict:
     path['settings'] = os.path.join(path['home'], 'settings.ini')
     # ~/tts_cache/
     path['tts_cache'] = os.path.join(path['home'], 'tts_cache')
+    # ~/modules/
+    path['modules'] = os.path.join(path['home'], 'modules')
     # ~/resources/
     path['resources'] = os.path.join(path['home'], 'resources')
     # ~/resources/models/
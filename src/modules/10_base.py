@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import logger
+import utils
+from modules_manager import EQ
+from modules_manager import ModuleWrapper, get_mode_say, get_enable_say
+from modules_manager import NM, DM, ANY
+from modules_manager import Next, Set, Say, SayLow
+
+mod = ModuleWrapper()
+
+
+@mod.name(ANY, 'Блокировка', 'Включение/выключение блокировки терминала')
+@mod.phrase(['Блокировка', EQ])
+def lock(self, phrase, *_):
+    if self.get_one_way is lock:
+        if phrase == 'блокировка':
+            return Set(one_way=None), Say('Блокировка снята')
+        else:
+            return Say('Блокировка')
+    else:
+        return Set(one_way=lock), Say('Блокировка включена')
+
+
+@mod.name(ANY, 'Отладка', 'Режим настройки и отладки')
+@mod.phrase(['Режим разработчика', EQ], NM)
+@mod.phrase(['Выход', EQ], DM)
+@mod.hardcoded()
+def debug(_, phrase, *__):
+    if phrase == 'выход':
+        return Set(debug=False), Say('Внимание! Выход из режима разработчика')
+    elif phrase == 'режим разработчика':
+        return Set(debug=True),\
+               Say('Внимание! Включён режим разработчика. Для возврата в обычный режим скажите \'выход\'')
+    return Next
+
+
+@mod.name(DM, 'Менеджер', 'Управление модулями')
+@mod.phrase(['Активировать везде', 'Активировать', 'Деактивировать', 'удалить', 'восстановить'], DM)
+@mod.hardcoded()
+def manager(self, phrase, mod_name):
+    mod_name = mod_name.lower()
+    if mod_name not in self.by_name:
+        self.log('Модуль {} не найден'.format(mod_name), logger.INFO)
+        return Next
+    mod_ = self.by_name[mod_name]
+    if self.all[mod_]['hardcoded']:
+        return Say('Модуль {} системный, его нельзя настраивать'.format(mod_name))
+
+    modes = {'активировать': NM, 'деактивировать': DM, 'активировать везде': ANY}
+    enables = {'удалить': False, 'восстановить': True}
+    if phrase in modes:
+        if not self.all[mod_]['enable']:
+            return Say('Модуль {} удален. Вначале его нужно восстановить'.format(mod_name))
+        new_mode = modes[phrase]
+        if self.all[mod_]['mode'] == new_mode:
+            return Say('Модуль {} уже в режиме {}'.format(mod_name, get_mode_say(new_mode)))
+        say = 'Теперь модуль {} доступен в режиме {}'.format(mod_name, get_mode_say(new_mode))
+        return Say(say), Set(mod_mode=[mod_, new_mode])
+    elif phrase in enables:
+        enable = enables[phrase]
+        if self.all[mod_]['enable'] == enable:
+            return Say('Модуль {} и так {}'.format(mod_name, get_enable_say(enable)))
+        say = 'Модуль {} {}'.format(mod_name, get_enable_say(enable))
+        return Say(say), Set(mod_enable=[mod_, enable])
+    else:
+        self.log('Это невозможно, откуда тут {}'.format(phrase), logger.CRIT)
+        return Next
+
+
+@mod.name(DM, 'Скажи', 'Произнесение фразы')
+@mod.phrase('Скажи')
+def this_say(_, __, phrase):
+    return Say(phrase) if phrase else None
+
+
+@mod.name(ANY, 'Ничего', 'Ничего')
+@mod.phrase(['Ничего', EQ])
+def this_nothing(*_):
+    pass
+
+
+@mod.name(DM, 'считалка', 'Считалка до числа. Или от числа до числа. Считалка произносит не больше 20 чисел за раз')
+@mod.phrase(['сосчитай', 'считай', 'посчитай'])
+def counter(_, __, cmd):
+    max_count = 20
+    data = cmd.lower().split()
+
+    if len(data) == 2 and data[0] == 'до' and utils.is_int(data[1]) and int(data[1]) > 1:
+        all_num = int(data[1])
+        from_ = 1
+        to_ = int(data[1])
+        inc_ = 1
+    elif len(data) == 4 and utils.is_int(data[1]) and utils.is_int(data[3]) \
+            and data[0] == 'от' and data[2] == 'до' and abs(int(data[3]) - int(data[1])) > 0:
+        all_num = abs(int(data[3]) - int(data[1]))
+        from_ = int(data[1])
+        to_ = int(data[3])
+        inc_ = 1 if from_ < to_ else -1
+    else:
+        return Next
+
+    if all_num > 500:
+        return Say(utils.Template('Это слишком много для меня - считать {} чисел.', all_num))
+
+    numbers = []
+    count = 0
+    say = []
+    while True:
+        numbers.append(str(from_))
+        count += 1
+        if count == max_count:
+            say.append(utils.Template(', '.join(['{}'] * len(numbers)), *numbers))
+            count = 0
+            numbers = []
+        if from_ == to_:
+            break
+        from_ += inc_
+
+    if len(numbers):
+        say.append(utils.Template(', '.join(['{}'] * len(numbers)), *numbers))
+    say.append('Я всё сосчитала')
+    return SayLow(phrases=say)
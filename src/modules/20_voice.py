@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import utils
+from modules_manager import EQ
+from modules_manager import ModuleWrapper
+from modules_manager import DM
+from modules_manager import Next, Say
+
+mod = ModuleWrapper()
+
+
+@mod.name(DM, 'Кто я', 'Получение информации о настройках голосового генератора (только для Яндекса и RHVoice)')
+@mod.phrase([['кто ты', EQ], ['какая ты', EQ]])
+def who_am_i(self, *_):
+    def get_yandex_emo():
+        return utils.YANDEX_EMOTION.get(self.cfg['yandex'].get('emotion', 'unset'), 'ошибка')
+
+    speakers = __tts_selector(self)
+    if speakers is None:
+        return Say('Не поддерживается для {}'.format(self.cfg['providertts']))
+
+    speaker = self.cfg[self.cfg['providertts']].get('speaker', 'unset')
+    emotion = ' Я очень {}.'.format(get_yandex_emo()) if self.cfg['providertts'] == 'yandex' else ''
+    return Say('Меня зовут {}.{}'.format(speakers.get(speaker, 'Ошибка'), emotion))
+
+
+@mod.name(DM, 'Теперь я', 'Изменение характера или голоса голосового генератора (только для Яндекса и RHVoice)')
+@mod.phrase(['теперь ты', 'стань'])
+def now_i(self, _, cmd):
+    speakers = __tts_selector(self)
+    prov = self.cfg['providertts']
+    if speakers is None:
+        return Say('Не поддерживается для {}'.format(prov))
+
+    if cmd:
+        if prov == 'yandex':
+            for key, val in utils.YANDEX_EMOTION.items():
+                if cmd == val:
+                    return __now_i_set_emo(self, key)
+        cmd = cmd[0].upper() + cmd[1:]
+        for key, val in speakers.items():
+            if cmd == val:
+                return __now_i_set_speaker(self, key, self.cfg[prov], speakers, prov == 'yandex')
+    return Next
+
+
+def __tts_selector(self):
+    if self.cfg['providertts'] == 'rhvoice-rest':
+        speakers = utils.RHVOICE_SPEAKER
+    elif self.cfg['providertts'] == 'yandex':
+        speakers = utils.YANDEX_SPEAKER
+    else:
+        return None
+
+    if self.cfg['providertts'] not in self.cfg:
+        self.cfg[self.cfg['providertts']] = {}
+    return speakers
+
+
+def __now_i_set_speaker(self, key, prov: dict, speakers: dict, yandex=False):
+    if key == prov.get('speaker', 'unset'):
+        return Say('Я уже {}.'.format(speakers[key]))
+
+    prov['speaker'] = key
+    self.cfg.config_save()
+    return Say('Теперь меня зовут {}, а еще я {}.'.format(
+        speakers[key],
+        utils.YANDEX_EMOTION.get(self.cfg['yandex'].get('emotion', 'unset'), 'Ошибка')
+        if yandex else 'без характера'
+    ))
+
+
+def __now_i_set_emo(self, key):
+    if key == self.cfg.get('emotion', 'unset'):
+        return Say('Я и так {}.'.format(utils.YANDEX_EMOTION[key]))
+
+    self.cfg['yandex']['emotion'] = key
+    self.cfg.config_save()
+    return Say('Теперь я очень {} {}.'.format(
+        utils.YANDEX_EMOTION[key],
+        utils.YANDEX_SPEAKER.get(self.cfg['yandex'].get('speaker', 'unset'), 'Ошибка')
+    ))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+from collections import OrderedDict
+
+import wikipedia
+
+import logger
+from modules_manager import ModuleWrapper
+from modules_manager import DM
+from modules_manager import Next, Say, Ask
+
+wikipedia.set_lang('ru')
+
+mod = ModuleWrapper()
+
+
+class WikiCache:
+    # Кэш ответов вики на диске. Ответ хранится как есть, поэтому и tts кэш для него тоже сработает
+    NAME = 'wiki_cache'
+    TTL = 7 * 24 * 3600
+    NEGATIVE_TTL = 24 * 3600  # Для 'не знаю' и 'уточните'
+    MAX_SIZE = 500
+    OK, PAGE, DISAMBIGUATION = 'ok', 'page', 'disambiguation'
+
+    def __init__(self, cfg):
+        self._cfg = cfg
+        self._lock = threading.Lock()
+        # Порядок - от давно использованных к недавним, [время записи, тип, значение]
+        self._data = OrderedDict()
+        data = cfg.load_dict(self.NAME) or {}
+        for key, created, kind, value in data.get('items', []):
+            if not self._expired(created, kind):
+                self._data[key] = [created, kind, value]
+
+    @staticmethod
+    def normalize(phrase: str) -> str:
+        return ' '.join(phrase.lower().split())
+
+    def get(self, phrase: str) -> list or None:
+        key = self.normalize(phrase)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if self._expired(*entry[:2]):
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1:]
+
+    def put(self, phrase: str, kind: str, value=None):
+        with self._lock:
+            key = self.normalize(phrase)
+            self._data[key] = [time.time(), kind, value]
+            self._data.move_to_end(key)
+            while len(self._data) > self.MAX_SIZE:
+                self._data.popitem(last=False)
+            items = [[key, *val] for key, val in self._data.items()]
+        self._cfg.save_dict(self.NAME, {'items': items})
+
+    def _expired(self, created, kind) -> bool:
+        return time.time() - created > (self.TTL if kind == self.OK else self.NEGATIVE_TTL)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache(cfg) -> WikiCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = WikiCache(cfg)
+        return _cache
+
+
+def _wiki_reply(phrase, kind, value):
+    if kind == WikiCache.OK:
+        return Say(value)
+    elif kind == WikiCache.DISAMBIGUATION:
+        return Ask('Уточните свой вопрос: {}'.format('. '.join(value)))
+    return Say('Я ничего не знаю о {}.'.format(phrase))
+
+
+@mod.name(DM, 'Вики', 'Поиск в Википедии', deadline=3)
+@mod.phrase(['расскажи', 'что ты знаешь', 'кто такой', 'что такое', 'зачем нужен', 'для чего'])
+def wiki(self, _, phrase):
+    if not self.code:  # активация фразой
+        del_ = ['о ', 'про ', 'в ']
+        for k in del_:
+            if phrase.startswith(k):
+                phrase = phrase[len(k):]
+                break
+        phrase.strip()
+    if not phrase:
+        return Next
+
+    cache = _get_cache(self.cfg)
+    cached = cache.get(phrase)
+    if cached is not None:
+        self.log('Нашла в кэше вики \'{}\''.format(phrase), logger.DEBUG)
+        return _wiki_reply(phrase, *cached)
+    self.log('Ищу в вики о \'{}\''.format(phrase), logger.INFO)
+
+    try:
+        summary = wikipedia.summary(phrase, sentences=2, chars=1000)
+    except wikipedia.exceptions.DisambiguationError as e:
+        cache.put(phrase, WikiCache.DISAMBIGUATION, e.options)
+        return _wiki_reply(phrase, WikiCache.DISAMBIGUATION, e.options)
+    except wikipedia.exceptions.PageError:
+        cache.put(phrase, WikiCache.PAGE)
+        return _wiki_reply(phrase, WikiCache.PAGE, None)
+    cache.put(phrase, WikiCache.OK, summary)
+    return _wiki_reply(phrase, WikiCache.OK, summary)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+from modules_manager import EQ
+from modules_manager import ModuleWrapper, get_mode_say
+from modules_manager import DM
+from modules_manager import Next, Set, Say, SayLow
+
+mod = ModuleWrapper()
+
+
+@mod.name(DM, 'Помощь', 'Справку по модулям (вот эту)')
+@mod.phrase(['помощь', 'справка', 'help', 'хелп'])
+def help_(self, _, phrase):
+    def words():
+        return ', '.join(data[0] or 'любую фразу' for data in self.words_by_f(f))
+    if phrase:
+        if phrase in self.by_name:
+            f = self.by_name[phrase]
+            is_del = '' if self.all[f]['enable'] else '. Модуль удален'
+            say = 'Модуль {} доступен в режиме {}. Для активации скажите {}. Модуль предоставляет {} {}'.format(
+                phrase, get_mode_say(self.all[f]['mode']), words(), self.all[f]['desc'], is_del
+            )
+            return Say(say)
+        else:
+            return Next
+    say = ['Всего доступно {} модулей. Вот они:']
+
+    deleted = []
+    for f in self.all:
+        if self.all[f]['enable']:
+            say.append('Скажите {}. Это активирует {}. Модуль предоставляет {}'.format(
+                words(), self.all[f]['name'], self.all[f]['desc']))
+        else:
+            deleted.append(self.all[f]['name'])
+    say[0] = say[0].format(len(self.all) - len(deleted))
+    if len(deleted):
+        say.append('Всего {} модулей удалены, это: {}'.format(len(deleted), ', '.join(deleted)))
+    say.append('Работа модуля помощь завершена.')
+    return SayLow(say)
+
+
+@mod.name(DM, 'Выход', 'Завершение работы голосового терминала')
+@mod.phrase([['Завершение работы', EQ], ['умри', EQ], ['сдохни', EQ]])
+def terminate_(*_):
+    return Say('Come Along With Me.'), Set(die=5)
+
+
+@mod.name(DM, 'Перезагрузка', 'Перезапуск голосового терминала')
+@mod.phrase([['Перезагрузка', EQ], ['Ребут', EQ], ['Рестарт', EQ], ['reboot', EQ]])
+def reboot_(*_):
+    return Say('Терминал перезагрузится через 5... 4... 3... 2... 1...'), Set(die=[5, True])
+
+
+@mod.name(DM, 'Конфликты', 'Проверку фраз модулей на конфликты')
+@mod.phrase([['Проверка конфликтов', EQ], ['Найди конфликты', EQ]], DM)
+def conflicts(self, *_):
+    count = sum(len(val) for val in self.conflicts_check().values())
+    if not count:
+        return Say('Конфликтов не найдено')
+    return Say('Найдено конфликтных фраз: {}. Подробности в логе'.format(count))
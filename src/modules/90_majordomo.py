@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import queue
+import threading
+import time
+
+import requests
+
+import logger
+import utils
+from modules_manager import ModuleWrapper
+from modules_manager import NM
+from modules_manager import Say
+from utils import REQUEST_ERRORS
+
+mod = ModuleWrapper()
+
+
+class Forwarder(threading.Thread):
+    # Отправляет фразы на сервер мажордомо в фоне через keep-alive соединение
+    QUEUE_SIZE = 20
+    RETRIES = 3
+    BACKOFF = 0.5  # Пауза перед повтором, удваивается
+    TIMEOUT = 10
+    SLOW = 2  # Если сервер отвечает дольше, одинаковые фразы из очереди отправляются один раз
+
+    def __init__(self, log, say):
+        super().__init__(name='MajordomoForwarder')
+        self.log = log
+        self._say = say
+        self._queue = queue.Queue(self.QUEUE_SIZE)
+        self._session = requests.Session()
+        self._session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self._stop_event = threading.Event()
+        self._last_time = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'sent': 0, 'failed': 0, 'retries': 0, 'dropped': 0, 'coalesced': 0, 'time': 0.0, 'max_time': 0.0
+        }
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self._session.close()
+        self.log('Статистика отправки на сервер: {}'.format(self.stats()), logger.INFO)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = self._stats.copy()
+        stats['avg_time'] = stats['time'] / stats['sent'] if stats['sent'] else 0
+        stats['queue'] = self._queue.qsize()
+        return stats
+
+    def put(self, ip: str, phrase: str) -> bool:
+        try:
+            self._queue.put_nowait((ip, phrase))
+        except queue.Full:
+            self._inc('dropped')
+            return False
+        return True
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                data = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            for ip, phrase in self._coalesce(data):
+                self._send(ip, phrase)
+
+    def _coalesce(self, data) -> list:
+        # Пока сервер тормозит, повторы одной фразы отправлять бессмысленно
+        result = [data]
+        if self._last_time < self.SLOW:
+            return result
+        while True:
+            try:
+                data = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if data in result:
+                self._inc('coalesced')
+            else:
+                result.append(data)
+        return result
+
+    def _send(self, ip, phrase):
+        url = 'http://{}/command.php'.format(ip)
+        delay = self.BACKOFF
+        err, response = None, None
+        for attempt in range(self.RETRIES):
+            if attempt:
+                self._inc('retries')
+                if self._stop_event.wait(delay):
+                    return  # Остановка - не ошибка доставки
+                delay *= 2
+            wtime, response = time.time(), None
+            try:
+                response = self._session.get(url, params={'qry': phrase}, timeout=self.TIMEOUT)
+                response.close()
+            except REQUEST_ERRORS as e:
+                err = str(e)
+                self.log('Ошибка коммуникации с сервером, попытка {}: {}'.format(attempt + 1, err), logger.WARN)
+                continue
+            self._last_time = time.time() - wtime
+            if response.ok:
+                with self._lock:
+                    self._stats['sent'] += 1
+                    self._stats['time'] += self._last_time
+                    self._stats['max_time'] = max(self._stats['max_time'], self._last_time)
+                self.log('Запрос был успешен за {}: {}'.format(utils.pretty_time(self._last_time), phrase), logger.DEBUG)
+                return
+            err = '{} {}'.format(response.status_code, response.reason)
+            if response.status_code < 500:
+                break  # Сервер отверг запрос, повтор не поможет
+            self.log('Ошибка сервера, попытка {}: {}'.format(attempt + 1, err), logger.WARN)
+        if response is None:
+            self._last_time = self.TIMEOUT
+        self.log('Ошибка коммуникации с сервером {}: {}'.format(ip, err), logger.ERROR)
+        self._say('Ошибка коммуникации с сервером majordomo')
+        self._inc('failed')
+
+    def _inc(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+
+_forwarder = None
+_forwarder_lock = threading.Lock()
+
+
+def _get_forwarder(self) -> Forwarder:
+    global _forwarder
+    with _forwarder_lock:
+        if _forwarder is None:
+            _forwarder = Forwarder(log=self.log_as('majordomo'), say=self.say_late)
+            _forwarder.start()
+        return _forwarder
+
+
+def stats() -> dict:
+    return _forwarder.stats() if _forwarder is not None else {}
+
+
+def stop():
+    global _forwarder
+    with _forwarder_lock:
+        if _forwarder is not None:
+            _forwarder.stop()
+            _forwarder = None
+
+
+@mod.name(NM, 'Мажордом', 'Отправку команд на сервер Мажордомо')
+@mod.phrase('')  # Захватит любые фразы
+def majordomo(self, _, phrase):
+    if not phrase:
+        self.log('Вы ничего не сказали?', logger.DEBUG)
+        return
+
+    if not self.cfg['ip_server']:
+        self.log('IP сервера majordomo не задан.', logger.CRIT)
+        return Say('IP сервера MajorDoMo не задан, исправте это! Мой IP адрес: {}'.format(self.cfg.get('ip', 'ошибка')))
+
+    # FIX: 'Скажи ' -> 'скажи '
+    if phrase.startswith('Скажи ', 0, 6):
+        phrase = 'с' + phrase[1:]
+
+    if not _get_forwarder(self).put(self.cfg['ip_server'], phrase):
+        self.log('Очередь запросов к серверу переполнена, фраза отброшена: {}'.format(phrase), logger.ERROR)
+        return Say('Сервер majordomo не успевает, повторите позже')
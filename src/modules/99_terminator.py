@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+
+from modules_manager import ModuleWrapper
+from modules_manager import ANY
+from modules_manager import Say
+
+mod = ModuleWrapper()
+
+
+@mod.name(ANY, 'Терминатор', 'Информацию что соответствие фразе не найдено')
+@mod.phrase('')
+def terminator(_, __, phrase):
+    return Say('Соответствие фразе не найдено: {}'.format(phrase))
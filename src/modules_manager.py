@@ -1,8 +1,17 @@
 #!/usr/bin/env python3
 
-from collections import OrderedDict
+import ast
+import importlib.util
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 
 import logger
+import utils
 
 EQ = 1  # phrase equivalent
 SW = 2  # phrase startswith - by default
@@ -56,7 +65,284 @@ class SayLow:  # Говорим с низким приоритетом
                 yield text
 
 
+class _Trie:
+    # Префиксное дерево. Значения хранятся в узле под ключом None
+    def __init__(self):
+        self._root = {}
+
+    def add(self, word: str, item):
+        node = self._root
+        for char in word:
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append(item)
+
+    def remove(self, word: str, items: list):
+        node = self._root
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return
+        if None in node:
+            node[None] = [x for x in node[None] if x not in items]
+
+    def path(self, word: str):
+        # Все значения, фразы которых являются префиксом word
+        node = self._root
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return
+            if None in node:
+                yield from node[None]
+
+    def subtree(self, word: str):
+        # Все значения, фразы которых начинаются с word
+        node = self._root
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for key, val in node.items():
+                if key is None:
+                    yield from val
+                else:
+                    stack.append(val)
+
+
+class PhrasesIndex:
+    # Скомпилированный индекс фраз: EQ - хэш, SW - префиксное дерево, EW - дерево перевернутых фраз.
+    # Приоритет записи - (порядковый номер модуля, порядковый номер фразы в модуле)
+    def __init__(self):
+        self._any = []  # Пустые фразы, перехватывают все
+        self._eq = {}
+        self._sw = _Trie()
+        self._ew = _Trie()
+        self._by_f = {}
+
+    def add(self, f, priority: int, words_iter):
+        self.remove(f)
+        entries = []
+        for idx, (words, mode_) in enumerate(words_iter):
+            entry = ((priority, idx), f, words, mode_)
+            entries.append(entry)
+            if words == '':
+                self._any.append(entry)
+                self._any.sort()
+            elif mode_ == EQ:
+                self._eq.setdefault(words, []).append(entry)
+            elif mode_ == SW:
+                self._sw.add(words, entry)
+            elif mode_ == EW:
+                self._ew.add(words[::-1], entry)
+        if entries:
+            self._by_f[f] = entries
+
+    def remove(self, f):
+        entries = self._by_f.pop(f, None)
+        if not entries:
+            return
+        self._any = [x for x in self._any if x[1] is not f]
+        for entry in entries:
+            words, mode_ = entry[2:]
+            if words == '':
+                continue
+            elif mode_ == EQ and words in self._eq:
+                self._eq[words] = [x for x in self._eq[words] if x[1] is not f]
+                if not self._eq[words]:
+                    del self._eq[words]
+            elif mode_ == SW:
+                self._sw.remove(words, entries)
+            elif mode_ == EW:
+                self._ew.remove(words[::-1], entries)
+
+    def match(self, phrase: str) -> list:
+        # Функция, фраза, режим проверки. В порядке приоритета
+        result = self._any + self._eq.get(phrase, [])
+        result.extend(self._sw.path(phrase))
+        result.extend(self._ew.path(phrase[::-1]))
+        result.sort()
+        return [x[1:] for x in result]
+
+
+class ConflictsIndex:
+    # Ищет конфликты фраз: sample конфликтует с target, если проверяется раньше и перехватит его.
+    # Конфликты хранятся парами и обновляются для каждого модуля отдельно
+    def __init__(self, no_check):
+        self._no_check = no_check  # Эти модули не проверяем
+        self._any = []  # Пустые фразы
+        self._eq = {}  # Все фразы по тексту
+        self._sw = _Trie()  # EQ и SW
+        self._ew = _Trie()  # EQ и EW, перевернутые
+        self._by_f = {}
+        self._pairs = set()  # (фраза sample, модуль sample, модуль target)
+        self._pairs_by_f = {}
+
+    def add(self, f, priority: int, words_iter, in_order=False):
+        # in_order - модули добавляются по порядку приоритета, target искать не нужно
+        self.remove(f)
+        entries = [((priority, idx), f, words, mode_) for idx, (words, mode_) in enumerate(words_iter)]
+        for entry in entries:
+            for sample in self._samples(entry):
+                self._pair(sample, entry)
+            if not in_order:
+                for target in self._targets(entry):
+                    self._pair(entry, target)
+        for entry in entries:
+            words, mode_ = entry[2:]
+            if words == '':
+                self._any.append(entry)
+                continue
+            self._eq.setdefault(words, []).append(entry)
+            if mode_ in [EQ, SW]:
+                self._sw.add(words, entry)
+            if mode_ in [EQ, EW]:
+                self._ew.add(words[::-1], entry)
+        if entries:
+            self._by_f[f] = entries
+
+    def remove(self, f):
+        for pair in self._pairs_by_f.pop(f, ()):
+            self._pairs.discard(pair)
+            other = pair[2] if pair[1] is f else pair[1]
+            if other in self._pairs_by_f:
+                self._pairs_by_f[other].discard(pair)
+        entries = self._by_f.pop(f, None)
+        if not entries:
+            return
+        self._any = [x for x in self._any if x[1] is not f]
+        for words, mode_ in set(x[2:] for x in entries):
+            if words == '':
+                continue
+            if words in self._eq:
+                self._eq[words] = [x for x in self._eq[words] if x[1] is not f]
+                if not self._eq[words]:
+                    del self._eq[words]
+            if mode_ in [EQ, SW]:
+                self._sw.remove(words, entries)
+            if mode_ in [EQ, EW]:
+                self._ew.remove(words[::-1], entries)
+
+    def conflicts(self) -> dict:
+        result = {}
+        for words, sample, target in self._pairs:
+            if words not in result:
+                result[words] = set()
+            result[words].update((sample, target))
+        return result
+
+    def _samples(self, target):
+        # Фразы, которые могут перехватить target
+        words, mode_ = target[2:]
+        yield from self._any
+        yield from self._eq.get(words, [])
+        if mode_ != EW:
+            yield from self._sw.path(words)
+        if mode_ in [EQ, EW]:
+            yield from (x for x in self._ew.path(words[::-1]) if x[3] == EW)
+
+    def _targets(self, sample):
+        # Фразы, которые может перехватить sample
+        words, mode_ = sample[2:]
+        if words == '':
+            for entries in self._by_f.values():
+                yield from entries
+            return
+        yield from self._eq.get(words, [])
+        if mode_ in [EQ, SW]:
+            yield from (x for x in self._sw.subtree(words) if x[3] != EW)
+        elif mode_ == EW:
+            yield from self._ew.subtree(words[::-1])
+
+    def _pair(self, sample, target):
+        if sample[1] is target[1] or sample[1] in self._no_check or sample[0] > target[0]:
+            return
+        pair = (sample[2], sample[1], target[1])
+        if pair not in self._pairs:
+            self._pairs.add(pair)
+            for f in pair[1:]:
+                self._pairs_by_f.setdefault(f, set()).add(pair)
+
+
+class _LateReplies(threading.Thread):
+    # Применяет ответы модулей, не уложившихся в срок, в порядке их вызова
+    def __init__(self, apply):
+        super().__init__(name='LateReplies')
+        self._apply = apply
+        self._queue = queue.Queue()
+        self._work = False
+
+    def start(self):
+        self._work = True
+        super().start()
+
+    def stop(self):
+        self._work = False
+        self._queue.put_nowait(None)
+        self.join()
+
+    def put(self, f, future):
+        self._queue.put_nowait((f, future))
+
+    def run(self):
+        while self._work:
+            data = self._queue.get()
+            if data is None:
+                break
+            while self._work:
+                try:
+                    data[1].result(1)
+                except TimeoutError:
+                    continue
+                except Exception:
+                    pass
+                self._apply(*data)
+                break
+
+
+class ModulesStats:
+    # Статистика модулей: вызовы, перехваты, Next, опоздания и время работы
+    SAMPLES = 1000  # Для перцентилей храним только последние замеры
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def _get(self, name) -> dict:
+        if name not in self._data:
+            self._data[name] = {'calls': 0, 'matches': 0, 'next': 0, 'late': 0, 'times': deque(maxlen=self.SAMPLES)}
+        return self._data[name]
+
+    def add(self, name, work_time: float, reply):
+        with self._lock:
+            data = self._get(name)
+            data['calls'] += 1
+            data['next' if reply is Next else 'matches'] += 1
+            data['times'].append(work_time)
+
+    def late(self, name):
+        with self._lock:
+            self._get(name)['late'] += 1
+
+    def get(self) -> dict:
+        result = {}
+        with self._lock:
+            for name, data in self._data.items():
+                result[name] = {key: val for key, val in data.items() if key != 'times'}
+                times = sorted(data['times'])
+                for pct in [50, 95, 99]:
+                    val = times[min(len(times) - 1, len(times) * pct // 100)] if times else 0
+                    result[name]['p{}'.format(pct)] = round(val * 1000, 2)  # ms
+        return result
+
+
 class ModuleManager:
+    WORKERS = 4  # Сколько модулей с дедлайном может работать одновременно
+    THINKING = ['Секундочку', 'Минутку', 'Уже ищу', 'Сейчас узнаю']
+    BUSY = 'Я пока занята, повторите позже'
+
     def __init__(self, log, cfg, die_in, say):
         (self._log, self._m_log) = log
         self.cfg = cfg
@@ -66,8 +352,13 @@ class ModuleManager:
         self.debug = False
         # Если установлено, будет всегда вызывать его
         self.one_way = None
-        self._check_words = [NM, ANY]
         self.all = None
+        # Индексы фраз для обоих режимов, {debug: PhrasesIndex}
+        self._index = {False: PhrasesIndex(), True: PhrasesIndex()}
+        # Порядок модулей, для приоритета в индексе
+        self._priority = {}
+        # Конфликты фраз для обоих режимов, {debug: ConflictsIndex}
+        self._conflicts = {}
         # Для поиска по имени
         self.by_name = None
         self._code = 0
@@ -75,75 +366,96 @@ class ModuleManager:
         self._module_name = None
         # Без расширения
         self._cfg_name = 'modules'
+        self._stats_name = 'modules_stats'
         self._cfg_options = ['enable', 'mode', 'hardcoded']
         # Не проверяем данные модули на конфликты
         self._no_check = ['мажордом', 'терминатор']
+        # Модули с дедлайном выполняются в пуле, их опоздавшие ответы применяются в _late
+        self._pool = None
+        self._slots = threading.BoundedSemaphore(self.WORKERS)
+        self._late = _LateReplies(self._late_apply)
+        self._lock = threading.RLock()
+        self._stats = ModulesStats()
+        # Модули из файлов, которые не импортировались. Выключены до перезапуска, в настройках прежнее значение
+        self._broken = {}
 
     def start(self):
-        import modules
-        self.all = modules.mod.get
+        self.all = self._modules_load()
         # Для поиска по имени
         self.by_name = {val['name']: key for key, val in self.all.items()}
         # Загружаем настройки модулей
         self._set_options(self.cfg.load_dict(self._cfg_name))
+        self._index_build()
         self._log('Загружены модули: {}'.format(', '.join([key for key in self.by_name])))
-        self._conflicts_checker()
+        self.conflicts_check()
+        self._pool = ThreadPoolExecutor(max_workers=self.WORKERS)
+        self._late.start()
+
+    def stop(self):
+        self._late.stop()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+        for plugin in self._plugins():
+            plugin.stop()
+
+    def phrases(self) -> list:
+        # Неизменные ответы менеджера и модулей, для прогрева tts кэша
+        files = sorted({f.plugin.file for f in self.all or {} if getattr(f, 'plugin', None) is not None})
+        result = self.THINKING + [self.BUSY]
+        for file in files:
+            result.extend(utils.say_literals(file))
+        return result
+
+    def _plugins(self) -> list:
+        # Уже импортированные файлы модулей
+        result = []
+        for f in self.all or {}:
+            plugin = getattr(f, 'plugin', None)
+            if plugin is not None and plugin.module is not None and plugin not in result:
+                result.append(plugin)
+        return result
+
+    def _modules_load(self):
+        path = self.cfg.path['modules']
+        if not os.path.isdir(path):
+            self._log('Директория с модулями не найдена {}'.format(path), logger.CRIT)
+            return OrderedDict()
+        return plugins_load(path, self._log)
 
     def save(self):
         # Сохраняем настройки модулей
         self.cfg.save_dict(self._cfg_name, self._get_options())
-
-    def _conflicts_checker(self):
-        # Ищет возможные конфликты в модулях. Разные режимы сравниваются отдельно
-        no_check = [self.by_name[x] for x in self._no_check if x in self.by_name]
-        result = {}
-        self._set_debug(True)
-        result[DM] = self._conflicts_finder(no_check)
-        self._set_debug(False)
-        result[NM] = self._conflicts_finder(no_check)
+        self.cfg.save_dict(self._stats_name, self.stats())
+
+    def stats(self) -> dict:
+        # Статистика модулей и импортированных файлов модулей с функцией stats
+        result = {'modules': self._stats.get(), 'plugins': {}}
+        for plugin in self._plugins():
+            stats = getattr(plugin.module, 'stats', None)
+            if callable(stats):
+                result['plugins'][os.path.basename(plugin.file)] = stats()
+        return result
+
+    def conflicts_check(self) -> dict:
+        # Возможные конфликты в модулях. Разные режимы сравниваются отдельно.
+        # Индекс конфликтов обновляется при изменении модулей, тут только отчет
+        result = {DM: self._conflicts[True].conflicts(), NM: self._conflicts[False].conflicts()}
         for key, val in result.items():
             msg = []
             for target, data in val.items():
                 msg.append('{}: [{}]'.format(target, ', '.join([self.all[x]['name'] for x in data])))
             if msg:
                 self._log('Обнаружены конфликты в режиме {}: {}'.format(get_mode_say(key), ', '.join(msg)), logger.WARN)
-
-    def _conflicts_finder(self, no_check) -> dict:
-        conflicts = {}
-        all_ = [x for x in self._words_iter()]  # Метод, слово, режим слова
-        count = len(all_)
-        for num in range(count):
-            sample = all_[num]
-            for target in all_[num:]:
-                if sample[0] == target[0] or sample[0] in no_check:
-                    continue
-                if self._words_compare(sample[1:], target[1:]):  # Конфликт
-                    if sample[1] not in conflicts:
-                        conflicts[sample[1]] = set()
-                    conflicts[sample[1]].add(sample[0])
-                    conflicts[sample[1]].add(target[0])
-        return conflicts
-
-    @staticmethod
-    def _words_compare(one, two) -> bool:  # [фраза, метод]
-        if len(one[0]) > len(two[0]):
-            return False
-        if one[0] == '':  # Перехватит все
-            return True
-        if one[0] == two[0]:
-            return True
-        if two[0].startswith(one[0]) and one[1] in [EQ, SW] and two[1] != EW:
-            return True
-        if one[1] == EW and two[1] in [EQ, EW] and two[0].endswith(one[0]):
-            return True
-        return False
+        return result
 
     def _get_options(self):
         data = {}
-        for _, val in self.all.items():
+        for f, val in self.all.items():
             data[val['name']] = {}
             for key in self._cfg_options:
                 data[val['name']][key] = val[key]
+            if f in self._broken:
+                data[val['name']]['enable'] = self._broken[f]
         return data
 
     def __option_check(self, name, option: str, val) -> bool:
@@ -172,9 +484,26 @@ class ModuleManager:
                 if option in val and self.__option_check(key, option, val[option]):
                     self.all[f_name][option] = val[option]
 
+    def _index_build(self):
+        self._priority = {f: num for num, f in enumerate(self.all)}
+        no_check = {self.by_name[x] for x in self._no_check if x in self.by_name}
+        self._conflicts = {False: ConflictsIndex(no_check), True: ConflictsIndex(no_check)}
+        for f in self.all:
+            self._index_update(f, True)
+
+    def _index_update(self, f, in_order=False):
+        for debug, index in self._index.items():
+            words = list(self._words_by_mode(f, debug))
+            index.add(f, self._priority[f], words)
+            self._conflicts[debug].add(f, self._priority[f], words, in_order)
+
     def log(self, *args):
         self._m_log(self._module_name, *args)
 
+    def log_as(self, name: str):
+        # Лог с постоянным именем модуля для фоновых потоков, текущий модуль к тому времени сменится
+        return lambda *args: self._m_log(name, *args)
+
     def _set_one_way(self, f):
         self.one_way = f
 
@@ -184,6 +513,7 @@ class ModuleManager:
         if self.all[f]['enable'] == enable:
             self._log('Module {} already {}'.format(self.all[f].get('name', f), get_enable_say(enable)), logger.INFO)
         self.all[f]['enable'] = enable
+        self._index_update(f)
 
     def _set_mod_mode(self, f, mode_):
         if not self.__set_mod_check(f):
@@ -191,6 +521,7 @@ class ModuleManager:
         if self.all[f]['mode'] == mode_:
             self._log('Module {} already {}'.format(self.all[f].get('name', f), get_mode_say(mode_)), logger.INFO)
         self.all[f]['mode'] = mode_
+        self._index_update(f)
 
     def __set_mod_check(self, f):
         if f not in self.all:
@@ -216,14 +547,13 @@ class ModuleManager:
     def _set_debug(self, mode_: bool):
         if self.is_debug == mode_:
             return False
-        self._check_words = [NM, ANY] if not mode_ else [DM, ANY]
         self.debug = mode_
         return True
 
     def _phrases_testing(self, phrase, phrase_check):
         reply = Next
         self._code = 0
-        for f, words, mode_ in self._words_iter():
+        for f, words, mode_ in self._index[self.debug].match(phrase_check):
             if words == '':
                 reply = self._call_func(f, phrase_check, phrase)
             elif mode_ == EQ:
@@ -264,15 +594,18 @@ class ModuleManager:
         return self._phrases_testing(phrase, phrase_check)
 
     def words_by_f(self, f):
+        return self._words_by_mode(f, self.debug)
+
+    def _words_by_mode(self, f, debug: bool):
         def allow_any():
             if not val['enable']:
                 return False
             if val['mode'] == ANY:
                 return True
-            return self.debug == (val['mode'] == DM)
+            return debug == (val['mode'] == DM)
 
         val = self.all[f]
-        for words_target in self._check_words:
+        for words_target in ([DM, ANY] if debug else [NM, ANY]):
             if words_target in val and allow_any():
                 for check in val[words_target]:
                     if isinstance(check, str):
@@ -311,27 +644,101 @@ class ModuleManager:
             replies = [replies]
         result = None
         asking = None
-        for reply in replies:
-            reply_type = type(reply)
-            if reply_type is Set:
-                self._processing_set(reply)
-            elif reply_type is Say:
-                result = reply.text
-            elif reply_type is Ask:
-                result = reply.text
-                asking = f
-            elif reply_type is SayLow:
-                for text in reply.iter():
-                    self._say(*text)
+        with self._lock:
+            for reply in replies:
+                reply_type = type(reply)
+                if reply_type is Set:
+                    self._processing_set(reply)
+                elif reply_type is Say:
+                    result = reply.text
+                elif reply_type is Ask:
+                    result = reply.text
+                    asking = f
+                elif reply_type is SayLow:
+                    for text in reply.iter():
+                        self._say(*text)
         return result, asking
 
+    def _late_apply(self, f, future):
+        name = self.all.get(f, {}).get('name', f)
+        try:
+            reply = future.result()
+        except Exception as e:
+            self._log('Ошибка в модуле {}: {}'.format(name, e), logger.ERROR)
+            return
+        if reply is Next:
+            self._log('Модуль {} пропустил фразу, но искать дальше уже поздно'.format(name), logger.WARN)
+            return
+        result, asking = self._return_wrapper(f, reply)
+        if asking:
+            self._log('Модуль {} хотел переспросить, но ответ опоздал'.format(name), logger.INFO)
+        if result:
+            self.say_late(result)
+
+    def say_late(self, text: str):
+        # Для ответов, пришедших после того как модуль вернул управление
+        self._say(text, 1)
+
     def _call_func(self, f, *args):
         try:
             self._module_name = f.__name__
         except AttributeError:
             self._module_name = str(f)
         self._log('Захвачено {}'.format(f), logger.DEBUG)
-        return f(self, *args)
+        plugin = getattr(f, 'plugin', None)
+        if plugin is not None and plugin.load() is None:
+            return self._plugin_disable(plugin)
+        val = self.all.get(self._registered(f), {})
+        name = val.get('name', self._module_name)
+        deadline = val.get('deadline') if self._pool is not None else None
+        if deadline is None:
+            return self._call_timed(name, f, *args)
+        return self._call_deadline(name, f, deadline, *args)
+
+    def _registered(self, f):
+        # one_way и call_me могут быть сырой функцией модуля, в self.all лежит ее LazyModule
+        if f in self.all:
+            return f
+        for key in self.all:
+            if getattr(key, '_f', None) is f:
+                return key
+        return f
+
+    def _plugin_disable(self, plugin):
+        # Файл модулей не импортировался: выключаем все его модули, фраза уйдет дальше
+        names = []
+        with self._lock:
+            for f, val in self.all.items():
+                if getattr(f, 'plugin', None) is plugin and val['enable']:
+                    self._broken.setdefault(f, val['enable'])
+                    val['enable'] = False
+                    self._index_update(f)
+                    names.append(val['name'])
+        if names:
+            self._log('Ошибка импорта {}, модули {} выключены: {}'.format(
+                os.path.basename(plugin.file), ', '.join(names), plugin.error), logger.ERROR)
+        return Next
+
+    def _call_timed(self, name, f, *args):
+        wtime = time.time()
+        reply = f(self, *args)
+        self._stats.add(name, time.time() - wtime, reply)
+        return reply
+
+    def _call_deadline(self, name, f, deadline, *args):
+        # Модуль работает в пуле. Если не успел - говорим что думаем, ответ применится потом
+        if not self._slots.acquire(blocking=False):
+            self._log('Нет свободных потоков для модуля {}'.format(name), logger.WARN)
+            return Say(self.BUSY)
+        future = self._pool.submit(self._call_timed, name, f, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(deadline)
+        except TimeoutError:
+            self._log('Модуль {} не уложился в {} сек, ответ будет позже'.format(name, deadline), logger.INFO)
+            self._stats.late(name)
+            self._late.put(f, future)
+            return Say(random.SystemRandom().choice(self.THINKING))
 
     def _call_this(self, obj, *args):
         if callable(obj):
@@ -402,18 +809,21 @@ class ModuleWrapper:
 
         self._add(f, **{param: phrases})
 
-    def name(self, mode_, name, description):
+    def name(self, mode_, name, description, deadline=None):
         # Дефолтный режим, имя и описание
         # Изначально все модули включены. Отключенные модули ничего не триггерят
+        # deadline - сколько секунд ждать ответа модуля, потом он доработает в фоне
         name = name.lower()
         if not name or name in self.__names:
             raise RuntimeError('Module name must be set and unique: {}'.format(name))
         if mode_ not in [NM, DM, ANY]:
             raise RuntimeError('Unknown module {} mode: {}'.format(name, mode_))
+        if deadline is not None and (not isinstance(deadline, (int, float)) or deadline <= 0):
+            raise RuntimeError('Module {} deadline must be positive number: {}'.format(name, deadline))
         self.__names.add(name)
 
         def wrap(f):
-            self._add(f, mode=mode_, name=name, desc=description)
+            self._add(f, mode=mode_, name=name, desc=description, deadline=deadline)
             return f
         return wrap
 
@@ -439,3 +849,144 @@ class ModuleWrapper:
             self._add(f, hardcoded=True)
             return f
         return wrap
+
+
+class _Plugin:
+    # Файл с модулями. Импортируется при первом вызове любого из его модулей
+    def __init__(self, file):
+        self.file = file
+        self.module = None
+        self.error = None  # Почему файл не импортировался, повторно не пытаемся
+        self._lock = threading.Lock()
+
+    def load(self):
+        # Модуль файла или None, если импорт не удался
+        with self._lock:
+            if self.module is None and self.error is None:
+                spec = importlib.util.spec_from_file_location(
+                    'modules.{}'.format(os.path.splitext(os.path.basename(self.file))[0]), self.file
+                )
+                module = importlib.util.module_from_spec(spec)
+                try:
+                    spec.loader.exec_module(module)
+                except Exception as e:
+                    self.error = e
+                else:
+                    self.module = module
+        return self.module
+
+    def get(self, name):
+        return getattr(self.load(), name)
+
+    def stop(self):
+        # Если в файле есть функция stop, она будет вызвана при завершении работы
+        stop = getattr(self.module, 'stop', None)
+        if callable(stop):
+            stop()
+
+
+class LazyModule:
+    # Заглушка функции модуля, до первого вызова хранит только имя
+    def __init__(self, plugin: _Plugin, name: str):
+        self.__name__ = name
+        self.plugin = plugin
+        self._f = None
+
+    def __call__(self, *args, **kwargs):
+        if self._f is None:
+            self._f = self.plugin.get(self.__name__)
+        return self._f(*args, **kwargs)
+
+    def __repr__(self):
+        return '<module {} from {}>'.format(self.__name__, os.path.basename(self.plugin.file))
+
+
+_PLUGIN_CONSTANTS = {'EQ': EQ, 'SW': SW, 'EW': EW, 'NM': NM, 'DM': DM, 'ANY': ANY}
+_PLUGIN_DECORATORS = ['name', 'phrase', 'hardcoded']
+
+
+def _plugin_eval(node, file):
+    # Аргументы декораторов - литералы и константы режимов, больше ничего не доступно
+    return eval(compile(ast.Expression(body=node), file, 'eval'), {'__builtins__': {}}, _PLUGIN_CONSTANTS.copy())
+
+
+def _plugin_scan(file) -> OrderedDict:
+    # Читаем декораторы модулей из файла без его импорта
+    with open(file, encoding='utf8') as fp:
+        tree = ast.parse(fp.read(), file)
+    wrappers = set()
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Call) and \
+                isinstance(node.value.func, ast.Name) and node.value.func.id == 'ModuleWrapper':
+            wrappers.update(x.id for x in node.targets if isinstance(x, ast.Name))
+
+    mod = ModuleWrapper()
+    plugin = _Plugin(file)
+    for node in tree.body:
+        if not isinstance(node, ast.FunctionDef):
+            continue
+        decorators = [
+            x for x in node.decorator_list if isinstance(x, ast.Call) and isinstance(x.func, ast.Attribute) and
+            isinstance(x.func.value, ast.Name) and x.func.value.id in wrappers and x.func.attr in _PLUGIN_DECORATORS
+        ]
+        if not decorators:
+            continue
+        f = LazyModule(plugin, node.name)
+        for decorator in reversed(decorators):  # Декораторы применяются снизу вверх
+            args = [_plugin_eval(x, file) for x in decorator.args]
+            kwargs = {x.arg: _plugin_eval(x.value, file) for x in decorator.keywords}
+            getattr(mod, decorator.func.attr)(*args, **kwargs)(f)
+    return mod.get
+
+
+def _plugin_import(file) -> OrderedDict:
+    # Запасной путь для файлов, где аргументы декораторов не литералы: импортируем сразу
+    plugin = _Plugin(file)
+    module = plugin.load()
+    if module is None:
+        raise plugin.error
+    wrappers = []
+    for val in vars(module).values():
+        if isinstance(val, ModuleWrapper) and not [x for x in wrappers if x is val]:
+            wrappers.append(val)
+    result = OrderedDict()
+    for wrapper in wrappers:
+        for f, val in wrapper.get.items():
+            lazy = LazyModule(plugin, f.__name__)
+            lazy._f = f
+            result[lazy] = val
+    return result
+
+
+def _plugin_add(mod: ModuleWrapper, f, val: dict):
+    mod.name(val['mode'], val['name'], val['desc'], val.get('deadline'))(f)
+    for key in (NM, DM, ANY):
+        if key in val:
+            mod.phrase(val[key], key)(f)
+    if val.get('hardcoded'):
+        mod.hardcoded()(f)
+
+
+def plugins_load(path: str, log) -> OrderedDict:
+    # Модули из *.py файлов директории. Приоритет - по имени файла, затем по порядку в файле.
+    # Сломанный файл или модуль пропускается, остальные загрузятся
+    mod = ModuleWrapper()
+    for file in sorted(os.listdir(path)):
+        full_path = os.path.join(path, file)
+        if not file.endswith('.py') or file.startswith('_') or not os.path.isfile(full_path):
+            continue
+        try:
+            found = _plugin_scan(full_path)
+        except Exception as e:
+            log('Модули {}: декораторы не прочитать без импорта ({}), импортирую файл'.format(file, e), logger.INFO)
+            try:
+                found = _plugin_import(full_path)
+            except Exception as e:
+                log('Модули {} не загружены: {}'.format(file, e), logger.ERROR)
+                continue
+        for f, val in found.items():
+            try:
+                _plugin_add(mod, f, val)
+            except RuntimeError as e:
+                log('Модуль {} из {} не загружен: {}'.format(val.get('name', f), file, e), logger.ERROR)
+    return mod.get
@@ -8,6 +8,7 @@ import threading
 import time
 
 import logger
+import tts_pool
 
 
 class Player:
@@ -29,7 +30,7 @@ class Player:
         self._tts = tts
 
         self.mpd = None
-        self._lp_play = LowPrioritySay(self.really_busy, self.say, self.play)
+        self._lp_play = LowPrioritySay(self.really_busy, self.say, self.play, self._tts)
 
     def start(self, mpd):
         self._work = True
@@ -156,6 +157,9 @@ class Player:
     def _play(self, obj):
         (path, stream, ext) = obj() if callable(obj) else (obj, None, None) if isinstance(obj, str) else obj
         self.kill_popen()
+        if not stream and not os.path.isfile(path) and callable(getattr(obj, 'lost', None)):
+            # Файл из tts кэша удалили с диска, фраза синтезируется заново
+            (path, stream, ext) = obj.lost() or (path, stream, ext)
         ext = ext or os.path.splitext(path)[1]
         if not stream and not os.path.isfile(path):
             return self.log('Файл {} не найден'.format(path), logger.ERROR)
@@ -175,11 +179,13 @@ class Player:
 
 class LowPrioritySay(threading.Thread):
     TIMEOUT = 300
+    PREFETCH = 3  # Сколько фраз из очереди синтезировать одновременно
 
-    def __init__(self, is_busy, say, play):
+    def __init__(self, is_busy, say, play, tts):
         super().__init__(name='LowPrioritySay')
         self._play = play
         self._say = say
+        self._tts = tts
         self._is_busy = is_busy
         self._queue_in = queue.Queue()
         self._quiet = False
@@ -198,9 +204,17 @@ class LowPrioritySay(threading.Thread):
         self._quiet = True
         while not self._queue_in.empty():
             try:
-                self._queue_in.get_nowait()
+                say = self._queue_in.get_nowait()
             except queue.Empty:
                 pass
+            else:
+                self._cancel(say)
+
+    @staticmethod
+    def _cancel(say):
+        # Синтез выкинутой фразы больше не нужен
+        if say is not None and say[0] == 3 and hasattr(say[1], 'cancel'):
+            say[1].cancel()
 
     def say(self, msg: str, wait: float or int=0, is_file: bool = False):
         self._put(1 if not is_file else 3, msg, wait)
@@ -214,6 +228,8 @@ class LowPrioritySay(threading.Thread):
     def run(self):
         while self._work:
             say = self._queue_in.get()
+            if say is not None:
+                self._prefetch(say)
             while self._is_busy() and self._work:
                 time.sleep(0.01)
             if say is None or not self._work:
@@ -223,5 +239,13 @@ class LowPrioritySay(threading.Thread):
             elif say[0] == 2:
                 self._play(file=say[1], lvl=1, wait=say[2])
 
-
-
+    def _prefetch(self, say):
+        # Синтез текущей и следующих фраз начинается пока играет предыдущая, без пауз между ними
+        with self._queue_in.mutex:
+            targets = [say] + [x for x in self._queue_in.queue if x is not None][:self.PREFETCH - 1]
+        for num, target in enumerate(targets):
+            if target[0] == 1:
+                job = self._tts(target[1], priority=tts_pool.LOW if not num else tts_pool.PREFETCH)
+                if job is not None:  # Иначе пул перегружен, синтезируем когда дойдет очередь
+                    target[1] = job
+                    target[0] = 3
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import json
 import os
 import socket
 import threading
@@ -11,7 +12,7 @@ import utils
 
 
 class MDTServer(threading.Thread):
-    def __init__(self, cfg, log, play, terminal, die_in, stt):
+    def __init__(self, cfg, log, play, terminal, die_in, stt, stats):
         super().__init__(name='MDTServer')
         self.MDAPI = {
             'hi': self._api_voice,
@@ -28,6 +29,7 @@ class MDTServer(threading.Thread):
         self.MTAPI = {
             'settings': self._api_settings,
             'rec': self._api_rec,
+            'stats': self._api_stats,
         }
 
         self._cfg = cfg
@@ -36,6 +38,7 @@ class MDTServer(threading.Thread):
         self._terminal = terminal
         self._die_in = die_in
         self._stt = stt
+        self._stats = stats
 
         self.work = False
         self._socket = socket.socket()
@@ -80,7 +83,9 @@ class MDTServer(threading.Thread):
             self.log(msg, logger.DEBUG if allow else logger.WARN)
             try:
                 if allow:
-                    self._parse(self._socket_reader(conn))
+                    reply = self._parse(self._socket_reader(conn))
+                    if isinstance(reply, str):
+                        self._socket_send(conn, reply)
             finally:
                 conn.close()
         self._socket.close()
@@ -95,9 +100,9 @@ class MDTServer(threading.Thread):
         if len(cmd) != 2:
             cmd.append('')
         if cmd[0] in self.MDAPI:
-            self.MDAPI[cmd[0]](cmd[1])
+            return self.MDAPI[cmd[0]](cmd[1])
         elif cmd[0] in self.MTAPI:
-            self.MTAPI[cmd[0]](cmd[1])
+            return self.MTAPI[cmd[0]](cmd[1])
         else:
             self.log('Неизвестная комманда: {}'.format(cmd[0]), logger.WARN)
 
@@ -139,6 +144,12 @@ class MDTServer(threading.Thread):
             self.log('Конфиг не изменился', logger.DEBUG)
             return False
 
+    def _api_stats(self, _) -> str:
+        # Ответ уйдет обратно в сокет
+        stats = json.dumps(self._stats(), ensure_ascii=False)
+        self.log('Статистика: {}'.format(stats), logger.INFO)
+        return stats
+
     def _api_rec(self, cmd: str):
         param = cmd.split('_')  # должно быть вида rec_1_1, play_2_1, compile_5_1
         if len(param) != 3 or sum([1 if len(x) else 0 for x in param]) != 3:
@@ -175,18 +186,18 @@ class MDTServer(threading.Thread):
 
         self._terminal.paused(True)
 
-        hello = 'Запись {} образца на 5 секунд начнется после звукового сигнала'.format(nums[param[2]])
+        hello = utils.Template('Запись {} образца на 5 секунд начнется после звукового сигнала', nums[param[2]])
         save_to = os.path.join(self._cfg.path['tmp'], param[1] + param[2] + '.wav')
         self.log(hello, logger.INFO)
 
         err = self._stt.voice_record(hello=hello, save_to=save_to, convert_rate=16000, convert_width=2)
         self._terminal.paused(False)
         if err is None:
-            bye = 'Запись {} образца завершена. Вы можете прослушать свою запись.'.format(nums[param[2]])
+            bye = utils.Template('Запись {} образца завершена. Вы можете прослушать свою запись.', nums[param[2]])
             self._play.say(bye)
             self.log(bye, logger.INFO)
         else:
-            err = 'Ошибка сохранения образца {}: {}'.format(nums[param[2]], err)
+            err = utils.Template('Ошибка сохранения образца {}: {}', nums[param[2]], err)
             self.log(err, logger.ERROR)
             self._play.say(err)
 
@@ -198,7 +209,7 @@ class MDTServer(threading.Thread):
                 miss = True
                 err = 'Ошибка компиляции - файл {} не найден.'
                 self.log(err.format(x), logger.ERROR)
-                self._play.say(err.format(os.path.basename(x)))
+                self._play.say(utils.Template(err, os.path.basename(x)))
         if miss:
             return
         pmdl_name = 'model' + param[1] + self._cfg.path['model_ext']
@@ -209,14 +220,14 @@ class MDTServer(threading.Thread):
             snowboy = training_service.Training(*models)
         except RuntimeError as e:
             self.log('Ошибка компиляции модели {}: {}'.format(pmdl_path, e), logger.ERROR)
-            self._play.say('Ошибка компиляции модели номер {}'.format(param[1]))
+            self._play.say(utils.Template('Ошибка компиляции модели номер {}', param[1]))
         else:
             work_time = utils.pretty_time(time.time() - work_time)
             snowboy.save(pmdl_path)
             phrase = self._stt.phrase_from_files(models)
             msg = ', "{}",'.format(phrase) if phrase else ''
             self.log('Модель{} скомпилирована успешно за {}: {}'.format(msg, work_time, pmdl_path), logger.INFO)
-            self._play.say('Модель{} номер {} скомпилирована успешно за {}'.format(msg, param[1], work_time))
+            self._play.say(utils.Template('Модель{} номер {} скомпилирована успешно за {}', msg, param[1], work_time))
             self._cfg.models_load()
             if not self._api_settings({'models': {pmdl_name: phrase}}):
                 self._terminal.reload()
@@ -236,3 +247,9 @@ class MDTServer(threading.Thread):
                 break
             data += tmp
         return data.decode().split('\r\n', 1)[0]
+
+    def _socket_send(self, conn, data: str):
+        try:
+            conn.sendall(data.encode() + b'\r\n')
+        except (BrokenPipeError, ConnectionResetError, socket.timeout) as e:
+            self.log('Ошибка отправки ответа: {}'.format(e), logger.WARN)
@@ -4,63 +4,252 @@ import hashlib
 import os
 import os.path
 import random
+import re
+import subprocess
 import threading
 import time
 import wave
+from collections import OrderedDict, deque
 
 import pyaudio
 import speech_recognition as sr
 
 import lib.STT as STT
 import lib.TTS as TTS
+import lib.http_session as http_session
+import lib.rhvoice_worker as rhvoice_worker
 import logger
+import tts_hedge
+import tts_pool
 import utils
+from tts_cache import TTSCache
 
 
 class TextToSpeech:
+    PREWARM_WORKERS = 2  # Сколько фраз прогрева синтезировать одновременно
+    CHUNK_FROM = 200  # Текст длиннее синтезируется по предложениям
+    # После точки за этими словами (и за любой одной буквой) предложение не кончается
+    ABBREVIATIONS = {
+        'гг', 'вв', 'др', 'пр', 'им', 'ул', 'см', 'стр', 'тыс', 'млн', 'млрд', 'руб', 'коп', 'тов', 'проф', 'акад',
+        'mr', 'mrs', 'ms', 'dr', 'st', 'vs', 'etc',
+    }
+    LEXICON = [str(x) for x in range(61)]  # Числа для подстановок в шаблоны, прогреваются заранее
+
     def __init__(self, cfg, log):
         self.log = log
         self._cfg = cfg
+        self._work = True
+        http_session.configure(cfg['tts'].get('http_pool', 4), cfg['tts'].get('keep_alive', 60))
+        rhvoice_worker.configure(cfg['rhvoice'].get('worker', ''))
+        self.cache = TTSCache(cfg, log, voice=self._voice)
+        self.cache.start()
+        self._pool = tts_pool.TTSPool(log)
+        self._hedge = tts_hedge.Hedge(log)
+        # Фразы для прогрева кэша и (провайдер, голос) для которых он уже был
+        self._prewarm_phrases = []
+        self._prewarm_voice = None
+        self._prewarm_thread = None
+        self._prewarm_lock = threading.Lock()
+
+    def stop(self):
+        self._work = False
+        with self._prewarm_lock:
+            thread = self._prewarm_thread
+        if thread is not None:
+            thread.join()
+        self._pool.stop()
+        self.cache.stop()
+        http_session.close()
+        rhvoice_worker.stop()
+
+    def stats(self) -> dict:
+        return {'pool': self._pool.stats(), 'cache': self.cache.stats(), 'hedge': self._hedge.stats()}
+
+    def prewarm(self, phrases: list):
+        # Синтезирует в кэш фразы которых там еще нет, в фоне.
+        # Повторяется сам при смене провайдера или голоса
+        with self._prewarm_lock:
+            self._prewarm_phrases = list(OrderedDict.fromkeys(self._prewarm_phrases + phrases))
+            self._prewarm_voice = None
+        self._prewarm_check()
+
+    def _prewarm_key(self) -> tuple:
+        prov = self._cfg.get('providertts', 'google')
+        return prov, self._voice(prov)
+
+    def _prewarm_check(self):
+        with self._prewarm_lock:
+            if self._prewarm_thread is not None or not self._prewarm_phrases or not self._work:
+                return
+            if self._prewarm_voice == self._prewarm_key():
+                return
+            self._prewarm_thread = threading.Thread(target=self._prewarm_run, name='TTSPrewarm')
+            self._prewarm_thread.start()
+
+    def _prewarm_run(self):
+        while self._work:
+            with self._prewarm_lock:
+                key = self._prewarm_key()
+                if key == self._prewarm_voice:
+                    self._prewarm_thread = None
+                    return
+                self._prewarm_voice = key
+                phrases = self._prewarm_phrases.copy()
+            if self._cfg['cache'].get('tts_size', 50) <= 0:
+                continue
+            wtime = time.time()
+            missing = [msg for msg in phrases if not self.cache.has(_TTSWrapper.sha1(self._cfg, key[0], msg), *key)]
+            jobs = deque()
+            for msg in missing:
+                if len(jobs) >= self.PREWARM_WORKERS:
+                    jobs.popleft().done.wait()
+                if not self._work:
+                    break
+                jobs.append(self._submit(msg, False, tts_pool.PREWARM))
+            for job in jobs:
+                job.done.wait()
+            self.log('Прогрев кэша {} {}: {} из {} фраз за {}'.format(
+                *key, len(missing), len(phrases), utils.pretty_time(time.time() - wtime)), logger.INFO)
+        with self._prewarm_lock:
+            self._prewarm_thread = None
+
+    def _joinable(self) -> bool:
+        # Склеить можно только mp3, в кэше всегда он
+        return self._cfg['cache'].get('tts_size', 50) > 0 or \
+            self._cfg.get('providertts', 'google') in _TTSWrapper.MP3_PROVIDERS
+
+    def _sentences(self, msg: str) -> list:
+        if len(msg) < self.CHUNK_FROM or not self._joinable():
+            return [msg]
+        msg = msg.strip()
+        result, start = [], 0
+        # Конец предложения - знак, пробел и слово с заглавной буквы, но не инициалы и не сокращения
+        for match in re.finditer(r'(?<=[.!?…])\s+(?=[^\W\d_])', msg):
+            head = msg[start:match.start()]
+            if not msg[match.end()].isupper():
+                continue
+            if head.endswith('.') and not head.endswith('...'):
+                word = re.search(r'(\w*)\.$', head).group(1)
+                if len(word) < 2 or word.lower() in self.ABBREVIATIONS:
+                    continue
+            result.append(head)
+            start = match.end()
+        result.append(msg[start:])
+        return [x for x in result if x]
+
+    def _segments(self, msg: utils.Template) -> list:
+        # Неизменные куски шаблона и подстановки синтезируются и кэшируются отдельно
+        if not self._joinable():
+            return [msg]
+        return [text.strip() for text, _ in msg.segments if text.strip()]
+
+    def _voice(self, prov: str) -> str:
+        # Все что влияет на звук, кэш хранит голоса раздельно
+        cfg = self._cfg.get(prov)
+        cfg = cfg if isinstance(cfg, dict) else {}
+        return TTSCache.voice_name(
+            cfg.get('speaker'), cfg.get('emotion'), _TTSWrapper.PROVIDERS.get(prov), _TTSWrapper.CACHE_FORMAT
+        )
 
-    def tts(self, msg, realtime: bool = True):
-        wrapper = _TTSWrapper(self._cfg, self.log, msg, realtime)
+    def tts(self, msg, realtime: bool = True, priority: int = tts_pool.INTERACTIVE):
+        # Вернет задачу синтеза: вызов отдаст (путь, поток, расширение) для плеера, cancel() отменит ее.
+        # Фоновую задачу при переполненной очереди не примет и вернет None
+        self._prewarm_check()
+        if not self._pool.accepts(priority):
+            return None
+        msg = msg if isinstance(msg, str) else str(msg)
+        sentences = self._segments(msg) if isinstance(msg, utils.Template) else self._sentences(msg)
+        if len(sentences) > 1:
+            wrapper = _TTSChain(lambda text: self._submit(text, realtime, priority), sentences, self.log)
+        else:
+            wrapper = self._submit(msg, realtime, priority)
         if not self._cfg.get('optimistic_nonblock_tts', 0):
             wrapper.event.wait(600)
-        return wrapper.get
+        return wrapper
+
+    def _submit(self, msg: str, realtime: bool, priority: int):
+        wrapper = _TTSWrapper(self._cfg, self.log, self.cache, self._hedge, msg, realtime)
+        self._pool.put(wrapper, priority)
+        return wrapper
 
 
-class _TTSWrapper(threading.Thread):
+class _TTSWrapper:
     PROVIDERS = {
         'google': 'ru',
         'yandex': 'ru-RU',
         'rhvoice-rest': '',
         'rhvoice': '',
     }
+    CACHE_FORMAT = 'mp3'
+    MP3_PROVIDERS = ['google', 'yandex']
 
-    def __init__(self, cfg, log, msg, realtime):
-        super().__init__()
+    def __init__(self, cfg, log, cache, hedge, msg, realtime):
         self.cfg = cfg
         self.log = log
+        self.cache = cache
+        self.hedge = hedge
         self.msg = msg if isinstance(msg, str) else str(msg)
         self.realtime = realtime
         self.file_path = None
         self._stream = None
         self._ext = None
+        self._hit = None  # (sha1, провайдер, голос) если файл взят из кэша
         self.event = threading.Event()
+        self.done = threading.Event()
+        self.cancelled = False
         self.work_time = None
         self.start_time = time.time()
-        self.start()
 
     def get(self):
         self.event.wait(600)
         self._unlock()
         return self.file_path, self._stream, self._ext
 
+    __call__ = get
+
+    def lost(self) -> tuple or None:
+        # Файла из кэша нет на диске: кэш его забудет, а фраза синтезируется заново.
+        # Проверяет тот, кто открывает файл, на обычном попадании лишних обращений к диску нет
+        if self._hit is None:
+            return None
+        self.cache.lost(*self._hit)
+        self._hit, self.file_path, self._stream, self._ext = None, None, None, None
+        self.work_time, self.start_time = None, time.time()
+        self.event.clear()
+        self.done.clear()
+        threading.Thread(target=self.run, name='TTSLost').start()
+        return self.get()
+
+    def cancel(self):
+        # Работает только пока задача в очереди
+        self.cancelled = True
+
     def run(self):
+        try:
+            if not self.cancelled:
+                self._run()
+        finally:
+            if self.file_path is None:
+                self.file_path = self.cfg.path['tts_error']
+            self._unlock()
+            self.done.set()
+
+    @staticmethod
+    def normalized(cfg, prov: str, msg: str) -> str:
+        # Правила могут отличаться у провайдеров, по умолчанию из tts.normalize
+        prov_cfg = cfg.get(prov)
+        prov_cfg = prov_cfg if isinstance(prov_cfg, dict) else {}
+        return utils.normalize_phrase(msg, prov_cfg.get('normalize', cfg['tts'].get('normalize', 'space,punct')))
+
+    @classmethod
+    def sha1(cls, cfg, prov: str, msg: str) -> str:
+        return hashlib.sha1(cls.normalized(cfg, prov, msg).encode()).hexdigest()
+
+    def _run(self):
         wtime = time.time()
-        sha1 = hashlib.sha1(self.msg.encode()).hexdigest()
         provider = self.cfg.get('providertts', 'google')
-        rname = '_'+sha1 + '.mp3'
+        text = self.normalized(self.cfg, provider, self.msg)
+        sha1 = hashlib.sha1(text.encode()).hexdigest()
         if self.realtime:
             self.log('say \'{}\''.format(self.msg), logger.INFO)
             msg_gen = ''
@@ -68,20 +257,55 @@ class _TTSWrapper(threading.Thread):
             msg_gen = '\'{}\' '.format(self.msg)
         use_cache = self.cfg['cache'].get('tts_size', 50) > 0
 
-        self.file_path = self._find_in_cache(rname, provider) if use_cache else None
+        voice = self.cache.voice(provider)
+        self.file_path = self._find_in_cache(provider, voice) if use_cache else None
+        flight, leader = None, True
+        if not self.file_path and use_cache:
+            flight, leader = self.cache.flight(sha1, provider, voice)
+            if flight is None:  # Только что дописали
+                self.file_path = self.cache.get(sha1, provider, voice)
+                self._hit = (sha1, provider, voice) if self.file_path else None
         if self.file_path:
             self._unlock()
             work_time = time.time() - wtime
             action = '{}найдено в кэше'.format(msg_gen)
             time_diff = ''
+        elif not leader:
+            self._follow(flight, self.cache.file_path(sha1, provider, voice))
+            self._unlock()
+            work_time = time.time() - wtime
+            action = '{}подключено к синтезу'.format(msg_gen)
+            time_diff = ''
         else:
-            format_ = 'mp3' if use_cache or provider in ['google', 'yandex'] else 'wav'
-            self.file_path = os.path.join(self.cfg.path['tts_cache'], provider + rname) if use_cache else \
-                '<{}><{}>'.format(sha1, format_)
-            self._tts_gen(self.file_path if use_cache else None, format_, self.msg)
+            provs = self._providers(provider)
+            mp3 = any(prov in self.MP3_PROVIDERS for prov in provs)
+            format_ = self.CACHE_FORMAT if use_cache or mp3 else 'wav'
+            if use_cache:
+                self.cache.miss(provider, voice)
+                self.file_path = self.cache.file_path(sha1, provider, voice)
+                tmp = self.file_path + '.part'
+            else:
+                self.file_path = '<{}><{}>'.format(sha1, format_)
+                tmp = None
+            winner = provider
+            raw = hashlib.sha1(self.msg.encode()).hexdigest() if text != self.msg else ''
+            try:
+                winner, size = self._tts_gen(tmp, format_, text, provs, flight)
+                if use_cache and size and winner != provider:
+                    # Ответил запасной провайдер, в кэш под его голосом
+                    self.file_path = self.cache.file_path(sha1, winner, self.cache.voice(winner))
+                    self.cache.publish(sha1, winner, self.cache.voice(winner), tmp, size, raw)
+                elif use_cache and size:
+                    self.cache.publish(sha1, provider, voice, tmp, size, raw)
+            finally:
+                # Что бы ни случилось, слушатели получат конец потока, а фраза не зависнет в синтезе
+                if use_cache:
+                    self._flight_end(flight)
+                    self.cache.abort(sha1, provider, voice)
+                    self._remove_part(tmp)
             self._unlock()
             work_time = time.time() - wtime
-            action = '{}сгенерированно {}'.format(msg_gen, provider)
+            action = '{}сгенерированно {}'.format(msg_gen, winner)
             reply = utils.pretty_time(self.work_time) if self.work_time is not None else 'NaN'
             diff = utils.pretty_time(work_time - self.work_time) if self.work_time is not None else 'NaN'
             time_diff = ' [reply:{}, diff:{}]'.format(reply, diff)
@@ -90,73 +314,220 @@ class _TTSWrapper(threading.Thread):
             logger.DEBUG if self.realtime else logger.INFO
         )
 
+    def _follow(self, flight, file_path: str):
+        # Такую же фразу уже синтезируют, слушаем тот же поток
+        flight.started.wait(600)
+        if flight.failed:
+            self.file_path = self.cfg.path['tts_error']
+        else:
+            self.file_path = file_path
+            self._stream = flight.subscribe()
+
     def _unlock(self):
         if self.work_time is None:
             self.work_time = time.time() - self.start_time
         self.event.set()
 
-    def _find_in_cache(self, rname: str, prov: str):
+    def _find_in_cache(self, prov: str, voice: str):
         prov_priority = self.cfg['cache'].get('tts_priority', '')
         file = None
         if prov_priority in self.PROVIDERS:  # Приоритет
-            file = self._file_check(rname, prov_priority)
+            file = self._cache_get(prov_priority, self.cache.voice(prov_priority))
 
         if not file and prov_priority != prov:  # Обычная, второй раз не чекаем
-            file = self._file_check(rname, prov)
+            file = self._cache_get(prov, voice)
+
+        hedge = self.cfg['tts'].get('hedge', '')
+        if not file and hedge in self.PROVIDERS and hedge not in (prov, prov_priority):
+            # Гонку выиграл запасной провайдер, фраза лежит под его голосом
+            file = self._cache_get(hedge, self.cache.voice(hedge))
 
         if not file and prov_priority == '*':  # Ищем всех
             for key in self.PROVIDERS:
                 if key != prov:
-                    file = self._file_check(rname, key)
+                    file = self._cache_get(key, self.cache.voice(key))
                 if file:
                     break
         return file
 
-    def _file_check(self, rname, prov):
-        file = os.path.join(self.cfg.path['tts_cache'], prov + rname)
-        return file if os.path.isfile(file) else ''
+    def _cache_get(self, prov: str, voice: str) -> str:
+        text = self.normalized(self.cfg, prov, self.msg)
+        sha1 = hashlib.sha1(text.encode()).hexdigest()
+        file = self.cache.get(sha1, prov, voice)
+        if file:
+            self._hit = (sha1, prov, voice)
+        if file and text != self.msg:
+            # Без нормализации, возможно, был бы промах
+            self.cache.normalized_hit(sha1, prov, voice, hashlib.sha1(self.msg.encode()).hexdigest())
+        return file
 
-    def _tts_gen(self, file, format_, msg: str):
-        prov = self.cfg.get('providertts', 'unset')
-        key = self.cfg.key(prov, 'apikeytts')
-        if TTS.support(prov):
-            try:
-                tts = TTS.GetTTS(
-                    prov,
-                    text=msg,
-                    speaker=self.cfg.get(prov, {}).get('speaker'),
-                    audio_format=format_,
-                    key=key,
-                    lang=self.PROVIDERS[prov],
-                    emotion=self.cfg.get(prov, {}).get('emotion'),
-                    url=self.cfg.get(prov, {}).get('server')
-                )
-            except RuntimeError as e:
-                self._synthesis_error(prov, key, e)
+    def _providers(self, prov: str) -> list:
+        # Основной и, если задан, запасной провайдер для гонки
+        hedge = self.cfg['tts'].get('hedge', '')
+        return [prov, hedge] if hedge and hedge != prov else [prov]
+
+    def _get_tts(self, prov: str, format_: str, msg: str):
+        return TTS.GetTTS(
+            prov,
+            text=msg,
+            speaker=self.cfg.get(prov, {}).get('speaker'),
+            audio_format=format_,
+            key=self.cfg.key(prov, 'apikeytts'),
+            lang=self.PROVIDERS[prov],
+            emotion=self.cfg.get(prov, {}).get('emotion'),
+            url=self.cfg.get(prov, {}).get('server')
+        )
+
+    def _tts_gen(self, file, format_, msg: str, provs: list, flight=None) -> tuple:
+        # Вернет (ответивший провайдер, размер записанного файла если он был успешно записан).
+        # Все что синтезировано получит и flight
+        for prov in provs:
+            if not TTS.support(prov) or prov not in self.PROVIDERS:
+                self.log('Неизвестный провайдер: {}'.format(prov), logger.CRIT)
                 self.file_path = self.cfg.path['tts_error']
-                return
-        else:
-            self.log('Неизвестный провайдер: {}'.format(prov), logger.CRIT)
+                return provs[0], self._flight_fail(flight)
+        try:
+            prov, chunks = self.hedge.race(
+                lambda x: self._get_tts(x, format_, msg), provs, self.cfg['tts'].get('hedge_after', 1.5)
+            )
+        except RuntimeError as e:
+            self._synthesis_error('/'.join(provs), self.cfg.key(provs[0], 'apikeytts'), e)
             self.file_path = self.cfg.path['tts_error']
-            return
-        self._stream = utils.FakeFP()
-        write_to = [self._stream]
-        if file:
-            write_to.append(open(file, 'wb'))
+            return provs[0], self._flight_fail(flight)
+        if flight is not None:
+            self._stream = flight.subscribe()
+            write_to = [flight]
+            flight.start()
+        else:
+            self._stream = utils.FakeFP()
+            write_to = [self._stream]
         self._ext = '.{}'.format(format_) if not file else None
         self._unlock()
+        size = None
         try:
-            tts.stream_to_fps(write_to)
+            if file:
+                write_to.append(open(file, 'wb'))
+            for chunk in chunks:
+                for fp in write_to:
+                    fp.write(chunk)
+            size = write_to[1].tell() if file else None
         except RuntimeError as e:
-            self._synthesis_error(prov, key, e)
-        for fp in write_to:
-            fp.close()
-        return
+            self._synthesis_error(prov, self.cfg.key(prov, 'apikeytts'), e)
+        except OSError as e:
+            self.log('Ошибка записи {}: {}'.format(file, e), logger.ERROR)
+        finally:
+            chunks.close()
+            for fp in write_to:
+                fp.close()
+        # Недописанный файл в кэше не нужен, его удалит вызывающий
+        return prov, size
+
+    @staticmethod
+    def _flight_fail(flight):
+        if flight is not None:
+            flight.start(False)
+
+    @staticmethod
+    def _flight_end(flight):
+        if flight is None:
+            return
+        if flight.started.is_set():
+            flight.close()
+        else:
+            flight.start(False)
+
+    def _remove_part(self, tmp: str):
+        try:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        except OSError as e:
+            self.log('Ошибка удаления {}: {}'.format(tmp, e), logger.ERROR)
 
     def _synthesis_error(self, prov, key, e):
         self.log('Ошибка синтеза речи от {}, ключ \'{}\'. ({})'.format(prov, key, e), logger.CRIT)
 
 
+class _TTSChain(threading.Thread):
+    # Длинный текст по предложениям: каждое синтезируется и кэшируется отдельно, несколько сразу.
+    # Плееру отдается один поток, первое предложение играет как только готово
+    AHEAD = 3  # Сколько предложений синтезировать наперед
+    BUFF_SIZE = 1024 * 8
+
+    def __init__(self, make, sentences: list, log):
+        super().__init__(name='TTSChain')
+        self._make = make
+        self._sentences = sentences
+        self.log = log
+        self._wrappers = [make(x) for x in sentences[:self.AHEAD]]
+        self._popen = None
+        self._cancelled = False
+
+    @property
+    def event(self):
+        return self._wrappers[0].event
+
+    def get(self):
+        self.event.wait(600)
+        return '<chain:{}>'.format(len(self._sentences)), self._stream, '.{}'.format(_TTSWrapper.CACHE_FORMAT)
+
+    __call__ = get
+
+    def cancel(self):
+        self._cancelled = True
+        for wrapper in self._wrappers:
+            wrapper.cancel()
+
+    def _stream(self, cmd, *_, **__):
+        self._popen = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.start()
+        return self._popen
+
+    def run(self):
+        for idx in range(len(self._sentences)):
+            if self._cancelled:
+                break
+            if idx + self.AHEAD < len(self._sentences):
+                self._wrappers.append(self._make(self._sentences[idx + self.AHEAD]))
+            try:
+                if not self._write(self._wrappers[idx]):
+                    break
+            except BrokenPipeError:
+                break
+        for wrapper in self._wrappers:  # Плеер остановлен, остальное не нужно
+            wrapper.cancel()
+        try:
+            self._popen.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    def _write(self, wrapper) -> bool:
+        path, stream, _ = wrapper.get()
+        fp = None
+        if stream is None:
+            try:
+                fp = open(path, 'rb')
+            except FileNotFoundError:
+                path, stream, _ = wrapper.lost() or (path, None, None)  # Файл удалили из кэша
+            except OSError as e:
+                self.log('Ошибка чтения {}: {}'.format(path, e), logger.ERROR)
+                return True
+        if stream is not None:  # Генерируется прямо сейчас
+            for data in iter(stream.get, b''):
+                if self._popen.poll() is not None:
+                    return False
+                self._popen.stdin.write(data)
+            return True
+        try:
+            with fp or open(path, 'rb') as fp:
+                for data in iter(lambda: fp.read(self.BUFF_SIZE), b''):
+                    if self._popen.poll() is not None:
+                        return False
+                    self._popen.stdin.write(data)
+        except OSError as e:
+            self.log('Ошибка чтения {}: {}'.format(path, e), logger.ERROR)
+        return True
+
+
 class SpeechToText:
     HELLO = ['Привет', 'Слушаю', 'На связи', 'Привет-Привет']
     DEAF = ['Я ничего не услышала', 'Вы ничего не сказали', 'Ничего не слышно', 'Не поняла']
@@ -5,15 +5,11 @@ import random
 import threading
 import time
 
-import wikipedia
-
 import logger
 import player
 import stts
 from lib import snowboydecoder
 
-wikipedia.set_lang('ru')
-
 
 class MDTerminal(threading.Thread):
     def __init__(self, cfg, play_: player.Player, stt: stts.SpeechToText, log, handler):
@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import logger
+import utils
+
+
+class Flight:
+    # Синтез который идет прямо сейчас. Байты раздаются всем слушателям,
+    # подключившиеся позже сначала получат уже полученное
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chunks = []
+        self._fps = []
+        self._closed = False
+        self.started = threading.Event()
+        self.failed = False  # Синтез так и не начался
+
+    def start(self, ok: bool = True):
+        self.failed = not ok
+        if not ok:
+            self.close()
+        self.started.set()
+
+    def subscribe(self) -> utils.FakeFP:
+        fp = utils.FakeFP()
+        with self._lock:
+            for chunk in self._chunks:
+                fp.write(chunk)
+            if self._closed:
+                fp.close()
+            else:
+                self._fps.append(fp)
+        return fp
+
+    def write(self, chunk):
+        with self._lock:
+            self._chunks.append(chunk)
+            for fp in self._fps:
+                fp.write(chunk)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for fp in self._fps:
+                fp.close()
+            self._fps.clear()
+
+
+class TTSCache(threading.Thread):
+    # Индекс tts кэша в памяти: (sha1, провайдер, голос) -> [размер, последнее использование, попаданий],
+    # от давно использованных к недавним. Файлы лежат как <провайдер>/<голос>/<ab>/<sha1>.<ext>, после старта
+    # на диск за проверкой не ходим. Размер кэша отслеживается при записи, лишнее удаляется в фоне.
+    # Индекс сохраняется в снапшот, при старте сверяется с mtime директорий, расхождения ищутся в фоне.
+    # Старый кэш без голоса (<провайдер>_<sha1>.<ext> и <провайдер>/<ab>/<sha1>.<ext>) считается записанным
+    # текущим голосом провайдера и переносится в фоне при первом запуске.
+    EXT = '.mp3'
+    CLEAN_TO = 0.7  # После очистки останется от cache.tts_size
+    SNAPSHOT = 'tts_cache_index.bin'
+    SNAPSHOT_VERSION = 3
+    SAVE_INTERVAL = 600
+    VARIANTS = 4  # Сколько разных исходных фраз помнить на файл, для учета попаданий благодаря нормализации
+    # Снапшот: заголовок, json с голосами и статистикой, затем записи индекса в порядке очереди.
+    # В записи sha1 - 20 байт, провайдер и голос - номер в списке голосов из json
+    _SNAPSHOT_HEAD = struct.Struct('>4sHdI')  # метка, версия, mtime дерева, длина json
+    _SNAPSHOT_ITEM = struct.Struct('>20sHIdI')  # sha1, голос, размер, последнее использование, попаданий
+    _SNAPSHOT_MAGIC = b'TTSI'
+
+    def __init__(self, cfg, log, voice):
+        super().__init__(name='TTSCache')
+        self._cfg = cfg
+        self._path = cfg.path['tts_cache']
+        self.log = log
+        # voice(провайдер) -> текущий голос провайдера
+        self.voice = voice
+        self._lock = threading.Lock()
+        self._index = OrderedDict()
+        self._size = 0
+        self._work = False
+        self._wakeup = threading.Event()
+        self._dirty = False  # Индекс изменился, снапшот надо переписать
+        self._touched = False  # Изменились только счетчики, их сохраним вместе с индексом или при остановке
+        self._reconcile = False
+        # Файлы которые еще лежат по старому, {(sha1, провайдер, голос): путь}
+        self._legacy = self._legacy_scan()
+        # Созданные директории шардов
+        self._shards = set()
+        # {(провайдер, голос): {hits, misses, written, served}}
+        self._stats = {}
+        # Файлы которые сейчас синтезируются, {(sha1, провайдер, голос): Flight}
+        self._flights = {}
+        # sha1 исходных фраз, которые нормализация свела к файлу, {(sha1, провайдер, голос): set}.
+        # Только в памяти и только для фраз, которые нормализация изменила
+        self._variants = {}
+        if not self._snapshot_load():
+            self._index_build()
+
+    def start(self):
+        self._work = True
+        super().start()
+
+    def stop(self):
+        self._work = False
+        self._wakeup.set()
+        self.join()
+        self._snapshot_save(True)
+
+    def run(self):
+        if self._legacy:
+            self._migrate()
+        if self._reconcile:
+            self._index_reconcile()
+        self._wakeup.set()  # Кэш мог вырасти пока нас не было, или квоту уменьшили
+        while self._work:
+            if not self._wakeup.wait(self.SAVE_INTERVAL):
+                self._snapshot_save()
+                continue
+            self._wakeup.clear()
+            if self._work:
+                self._evict()
+
+    @staticmethod
+    def voice_name(*params) -> str:
+        # Имя директории голоса из параметров синтеза, пустые пропускаются
+        name = '-'.join(str(param) for param in params if param)
+        return re.sub(r'[^\w.-]', '_', name) or 'default'
+
+    @classmethod
+    def shard_path(cls, root: str, sha1: str, prov: str, voice: str) -> str:
+        return os.path.join(root, prov, voice, sha1[:2], sha1 + cls.EXT)
+
+    @classmethod
+    def flat_path(cls, root: str, sha1: str, prov: str) -> str:
+        return os.path.join(root, '{}_{}{}'.format(prov, sha1, cls.EXT))
+
+    @classmethod
+    def _parse_flat(cls, name: str) -> tuple:
+        prov, sep, tail = name.partition('_')
+        if not (prov and sep and tail.endswith(cls.EXT)):
+            return None, None
+        return prov, tail[:-len(cls.EXT)]
+
+    @staticmethod
+    def _is_legacy_shard(name: str) -> bool:
+        # Имя голоса всегда длиннее, в нем есть формат
+        return len(name) == 2 and all(char in '0123456789abcdef' for char in name)
+
+    def _files_in(self, path: str):
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.name.endswith(self.EXT) and entry.is_file():
+                yield entry.name[:-len(self.EXT)], entry
+
+    def _legacy_scan(self) -> dict:
+        result = {}
+        try:
+            entries = list(os.scandir(self._path))
+        except OSError as e:
+            self.log('Ошибка чтения tts кэша {}: {}'.format(self._path, e), logger.ERROR)
+            return result
+        for entry in entries:
+            if entry.is_dir():
+                shards = [shard for shard in self._dirs_in(entry.path) if self._is_legacy_shard(shard.name)]
+                if shards:
+                    voice = self.voice(entry.name)
+                    for shard in shards:
+                        for sha1, file in self._files_in(shard.path):
+                            result[(sha1, entry.name, voice)] = file.path
+            elif entry.is_file():
+                prov, sha1 = self._parse_flat(entry.name)
+                if prov:
+                    result[(sha1, prov, self.voice(prov))] = entry.path
+        return result
+
+    @staticmethod
+    def _dirs_in(path: str) -> list:
+        try:
+            return [entry for entry in os.scandir(path) if entry.is_dir()]
+        except OSError:
+            return []
+
+    def _shards_scan(self) -> list:
+        # [(провайдер, голос, DirEntry шарда)], старые шарды без голоса тоже с голосом None
+        result = []
+        for prov in self._dirs_in(self._path):
+            for voice in self._dirs_in(prov.path):
+                if self._is_legacy_shard(voice.name):
+                    result.append((prov.name, None, voice))
+                    continue
+                result.extend((prov.name, voice.name, shard) for shard in self._dirs_in(voice.path))
+        return result
+
+    def _scan(self) -> dict:
+        # {(sha1, провайдер, голос): DirEntry} без старых файлов
+        result = {}
+        for prov, voice, shard in self._shards_scan():
+            if voice is not None:
+                for sha1, entry in self._files_in(shard.path):
+                    result[(sha1, prov, voice)] = entry
+        return result
+
+    def _index_build(self):
+        wtime = time.time()
+        files = []
+        for key, entry in self._scan().items():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_atime, key, stat.st_size))
+        for key, path in self._legacy.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_atime, key, stat.st_size))
+        # Начальный порядок по atime, дальше порядок ведем сами
+        for atime, key, size in sorted(files):
+            self._size += size - self._index.get(key, [0])[0]
+            self._index[key] = [size, atime, 0]
+        self._dirty = True
+        self.log('Индекс tts кэша построен: {} файлов, {} за {}'.format(
+            len(self._index), utils.pretty_size(self._size), utils.pretty_time(time.time() - wtime)), logger.INFO)
+
+    def _index_reconcile(self):
+        # Снапшот устарел - добавляем неизвестные файлы в начало очереди и выкидываем пропавшие
+        wtime = time.time()
+        files = self._scan()
+        added, lost = 0, 0
+        for key, entry in files.items():
+            if key in self._index:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            with self._lock:
+                if key not in self._index:
+                    self._index[key] = [stat.st_size, stat.st_atime, 0]
+                    self._index.move_to_end(key, last=False)
+                    self._size += stat.st_size
+                    added += 1
+        with self._lock:
+            # То что записано после начала сканирования могло в него не попасть
+            for key in [key for key, val in self._index.items()
+                        if key not in files and key not in self._legacy and val[1] < wtime]:
+                self._size -= self._index.pop(key)[0]
+                self._variants.pop(key, None)
+                lost += 1
+            self._dirty = True
+        self.log('Индекс tts кэша сверен за {}: добавлено {}, потеряно {}'.format(
+            utils.pretty_time(time.time() - wtime), added, lost), logger.INFO)
+
+    def _migrate(self):
+        wtime = time.time()
+        moved = 0
+        for key in list(self._legacy):
+            if not self._work:
+                break
+            file = self.shard_path(self._path, *key)
+            try:
+                self._make_shard(file)
+                with self._lock:
+                    if key in self._legacy:
+                        if os.path.isfile(file):  # Уже есть новый
+                            os.remove(self._legacy.pop(key))
+                        else:
+                            os.replace(self._legacy.pop(key), file)
+            except OSError as e:
+                self.log('Ошибка переноса {}: {}'.format(key, e), logger.WARN)
+                continue
+            moved += 1
+        self.log('Перенесено в шарды {} файлов tts кэша за {}, осталось {}'.format(
+            moved, utils.pretty_time(time.time() - wtime), len(self._legacy)), logger.INFO)
+
+    def _tree_mtime(self) -> float:
+        # Создание и удаление файла меняет mtime его директории
+        mtime = 0
+        try:
+            mtime = os.stat(self._path).st_mtime
+        except OSError:
+            pass
+        for _, _, entry in self._shards_scan():
+            try:
+                mtime = max(mtime, entry.stat().st_mtime)
+            except OSError:
+                pass
+        return mtime
+
+    def _snapshot_file(self) -> str:
+        return os.path.join(self._cfg.path['home'], self.SNAPSHOT)
+
+    def _snapshot_load(self) -> bool:
+        wtime = time.time()
+        try:
+            with open(self._snapshot_file(), 'rb') as fp:
+                data = fp.read()
+        except OSError:
+            self._remove_quiet(os.path.join(self._cfg.path['home'], 'tts_cache_index.json'))  # Старый снапшот
+            return False
+        try:
+            magic, version, mtime, size = self._SNAPSHOT_HEAD.unpack_from(data)
+            if magic != self._SNAPSHOT_MAGIC or version != self.SNAPSHOT_VERSION:
+                return False
+            offset = self._SNAPSHOT_HEAD.size + size
+            meta = json.loads(data[self._SNAPSHOT_HEAD.size:offset].decode())
+            voices = [tuple(x) for x in meta['voices']]
+            # Имена файлов не из sha1 лежат в json, они старше всех. Индекс строится одним проходом
+            other = meta.get('other', [])
+            rows = list(self._SNAPSHOT_ITEM.iter_unpack(data[offset:]))
+            keys = [(sha1,) + voices[voice] for sha1, voice, _, _, _ in other]
+            keys.extend([(sha1.hex(),) + voices[voice] for sha1, voice, _, _, _ in rows])
+            vals = [[size, last_hit, hits] for _, _, size, last_hit, hits in other]
+            vals.extend([[size, last_hit, hits] for _, _, size, last_hit, hits in rows])
+            self._index = OrderedDict(zip(keys, vals))
+            self._size = sum(val[0] for val in vals)
+            for prov, voice, stats in meta.get('stats', []):
+                self._stats[(prov, voice)] = dict(stats)
+        except (KeyError, TypeError, ValueError, IndexError, struct.error) as e:
+            self.log('Снапшот индекса tts кэша испорчен: {}'.format(e), logger.WARN)
+            self._index.clear()
+            self._stats.clear()
+            self._size = 0
+            return False
+        self._reconcile = mtime != self._tree_mtime()
+        self.log('Индекс tts кэша загружен: {} файлов, {} за {}{}'.format(
+            len(self._index), utils.pretty_size(self._size), utils.pretty_time(time.time() - wtime),
+            ', будет сверен' if self._reconcile else ''), logger.INFO)
+        return True
+
+    def _snapshot_save(self, final: bool = False):
+        # Одни попадания снапшот не переписывают, их счетчики сохранятся при остановке
+        if not (self._dirty or (final and self._touched)):
+            return
+        mtime = self._tree_mtime()  # До копирования, записанное после изменит mtime
+        with self._lock:
+            items = [(*key, *val) for key, val in self._index.items()]
+            stats = [[*key, val.copy()] for key, val in self._stats.items()]
+            self._dirty = self._touched = False
+        voices, packed, other = {}, [], []
+        pack = self._SNAPSHOT_ITEM.pack
+        for sha1, prov, voice, size, last_hit, hits in items:
+            idx = voices.setdefault((prov, voice), len(voices))
+            if len(sha1) == 40:
+                try:
+                    packed.append(pack(bytes.fromhex(sha1), idx, size, last_hit, hits))
+                    continue
+                except (ValueError, struct.error):
+                    pass
+            other.append([sha1, idx, size, last_hit, hits])
+        meta = json.dumps({'voices': list(voices), 'stats': stats, 'other': other}, ensure_ascii=False).encode()
+        file = self._snapshot_file()
+        tmp = file + '.part'
+        try:
+            with open(tmp, 'wb') as fp:
+                fp.write(self._SNAPSHOT_HEAD.pack(self._SNAPSHOT_MAGIC, self.SNAPSHOT_VERSION, mtime, len(meta)))
+                fp.write(meta)
+                fp.write(b''.join(packed))
+            os.replace(tmp, file)
+        except OSError as e:  # Поток кэша не должен упасть
+            self.log('Ошибка сохранения снапшота индекса tts кэша: {}'.format(e), logger.ERROR)
+            self._dirty = True
+            self._remove_quiet(tmp)
+
+    def _make_shard(self, file: str):
+        shard = os.path.dirname(file)
+        if shard not in self._shards:
+            os.makedirs(shard, exist_ok=True)
+            self._shards.add(shard)
+
+    def _file(self, key: tuple) -> str:
+        if key in self._legacy:
+            return self._legacy[key]
+        return self.shard_path(self._path, *key)
+
+    def _stat(self, prov: str, voice: str, name: str, value=1):
+        # Вызывать под локом
+        key = (prov, voice)
+        if key not in self._stats:
+            self._stats[key] = {'hits': 0, 'misses': 0, 'joined': 0, 'written': 0, 'served': 0, 'normalized_hits': 0}
+        self._stats[key][name] = self._stats[key].get(name, 0) + value
+        self._touched = True
+
+    def file_path(self, sha1: str, prov: str, voice: str) -> str:
+        # Путь для записи нового файла
+        file = self.shard_path(self._path, sha1, prov, voice)
+        self._make_shard(file)
+        return file
+
+    def get(self, sha1: str, prov: str, voice: str) -> str:
+        key = (sha1, prov, voice)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return ''
+            entry[1] = time.time()
+            entry[2] += 1
+            self._index.move_to_end(key)
+            self._stat(prov, voice, 'hits')
+            self._stat(prov, voice, 'served', entry[0])
+            return self._file(key)
+
+    def lost(self, sha1: str, prov: str, voice: str):
+        # Файл из индекса не нашелся на диске, его удалили в обход кэша. Забываем, фразу синтезируют заново
+        key = (sha1, prov, voice)
+        with self._lock:
+            entry = self._index.pop(key, None)
+            self._variants.pop(key, None)
+            file = self._legacy.pop(key, None) or self.shard_path(self._path, *key)
+            if entry is not None:
+                self._size -= entry[0]
+                self._dirty = True
+        if entry is not None:
+            self.log('Файл tts кэша пропал, будет синтезирован заново: {}'.format(file), logger.WARN)
+
+    def flight(self, sha1: str, prov: str, voice: str) -> tuple:
+        # (Flight, True) - синтезировать нам, (Flight, False) - уже синтезируется, подключайтесь,
+        # (None, False) - уже лежит в кэше
+        key = (sha1, prov, voice)
+        with self._lock:
+            if key in self._index:
+                return None, False
+            if key in self._flights:
+                self._stat(prov, voice, 'joined')
+                return self._flights[key], False
+            self._flights[key] = Flight()
+            return self._flights[key], True
+
+    def publish(self, sha1: str, prov: str, voice: str, tmp: str, size: int, raw: str = ''):
+        # Дописанный файл атомарно встает на свое место и попадает в индекс.
+        # raw - sha1 исходной фразы, если нормализация ее изменила
+        try:
+            os.replace(tmp, self.shard_path(self._path, sha1, prov, voice))
+        except OSError as e:
+            self.log('Ошибка сохранения в кэш {}: {}'.format(tmp, e), logger.ERROR)
+            self._remove(tmp)
+        else:
+            self.add(sha1, prov, voice, size)
+            if raw:
+                with self._lock:
+                    self._variants[(sha1, prov, voice)] = {raw}
+        self.abort(sha1, prov, voice)
+
+    def abort(self, sha1: str, prov: str, voice: str):
+        with self._lock:
+            self._flights.pop((sha1, prov, voice), None)
+
+    def has(self, sha1: str, prov: str, voice: str) -> bool:
+        # Без учета в статистике и очереди
+        return (sha1, prov, voice) in self._index
+
+    def miss(self, prov: str, voice: str):
+        with self._lock:
+            self._stat(prov, voice, 'misses')
+
+    def normalized_hit(self, sha1: str, prov: str, voice: str, raw: str):
+        # Попадание по нормализованной фразе raw. Засчитывается, только если такую исходную фразу
+        # этот файл еще не отдавал: без нормализации ее повтор тоже попал бы в кэш
+        key = (sha1, prov, voice)
+        with self._lock:
+            variants = self._variants.setdefault(key, set())
+            if raw in variants:
+                return
+            if len(variants) < self.VARIANTS:
+                variants.add(raw)
+            self._stat(prov, voice, 'normalized_hits')
+
+    def add(self, sha1: str, prov: str, voice: str, size: int):
+        key = (sha1, prov, voice)
+        with self._lock:
+            legacy = self._legacy.pop(key, None)
+            old = self._index.get(key)
+            self._size += size - (old[0] if old else 0)
+            self._index[key] = [size, time.time(), old[2] if old else 0]
+            self._index.move_to_end(key)
+            self._stat(prov, voice, 'written', size)
+            self._dirty = True
+            over = self._over_quota()
+        if legacy is not None:  # Записали новый, старый больше не нужен
+            self._remove(legacy)
+        if over:
+            self._wakeup.set()
+
+    def stats(self) -> dict:
+        # {провайдер: {голос: {hits, misses, joined, hit_rate, normalized_hits, written, served, files, size}}}
+        result = {}
+        with self._lock:
+            for (prov, voice), val in self._stats.items():
+                result.setdefault(prov, {})[voice] = dict(val, files=0, size=0)
+            for (_, prov, voice), val in self._index.items():
+                data = result.setdefault(prov, {}).setdefault(
+                    voice, {'hits': 0, 'misses': 0, 'joined': 0, 'written': 0, 'served': 0, 'files': 0, 'size': 0})
+                data['files'] += 1
+                data['size'] += val[0]
+        for voices in result.values():
+            for data in voices.values():
+                data.setdefault('normalized_hits', 0)
+                total = data['hits'] + data['misses']
+                data['hit_rate'] = round(data['hits'] / total, 3) if total else 0
+        return result
+
+    def files(self) -> int:
+        return len(self._index)
+
+    def size(self) -> int:
+        return self._size
+
+    def _max_size(self) -> int:
+        return self._cfg['cache'].get('tts_size', 50) * 1024 * 1024
+
+    def _over_quota(self) -> bool:
+        max_size = self._max_size()
+        return 0 <= max_size <= self._size and bool(self._index)
+
+    def _evict(self):
+        with self._lock:
+            if not self._over_quota():
+                return
+            new_size = int(self._max_size() * self.CLEAN_TO)
+            old_size = self._size
+            to_delete = []
+            # Сначала убираем из индекса, чтобы удаляемые файлы больше не отдавались
+            while self._index and self._size > new_size:
+                key, val = self._index.popitem(last=False)
+                self._size -= val[0]
+                to_delete.append(self._file(key))
+                self._legacy.pop(key, None)
+                self._variants.pop(key, None)
+            self._dirty = True
+        self.log('Размер tts кэша {}, удаляем...'.format(utils.pretty_size(old_size)), logger.INFO)
+        for file in to_delete:
+            self.log('Удаляю {}'.format(file))
+            self._remove(file)
+        self.log('Удалено {} файлов. Новый размер TTS кэша {}.'.format(
+            len(to_delete), utils.pretty_size(self._size)), logger.INFO)
+
+    @staticmethod
+    def _remove_quiet(file: str):
+        try:
+            os.remove(file)
+        except OSError:
+            pass
+
+    def _remove(self, file: str):
+        try:
+            os.remove(file)
+        except OSError as e:
+            self.log('Ошибка удаления {}: {}'.format(file, e), logger.WARN)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+
+import logger
+
+
+def _joined(first: bytes, chunks):
+    # Первый кусок уже прочитан, закрытие дойдет до провайдера
+    try:
+        yield first
+        yield from chunks
+    finally:
+        chunks.close()
+
+
+class _Race:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.winner = None
+        self.started = 0
+        self.failed = []
+
+    def win(self, prov: str, chunks) -> bool:
+        with self.cond:
+            if self.winner is not None:
+                return False
+            self.winner = prov, chunks
+            self.cond.notify_all()
+            return True
+
+    def fail(self, prov: str, e: Exception):
+        with self.cond:
+            self.failed.append('{}: {}'.format(prov, e))
+            self.cond.notify_all()
+
+    def over(self) -> bool:
+        # Вызывать под локом
+        return self.winner is not None or len(self.failed) >= self.started
+
+
+class Hedge:
+    # Гонка провайдеров за первый байт. Если основной не прислал звук за after секунд или упал,
+    # тот же текст просим у следующего. Играет тот кто ответил первым, проигравший закрывается.
+    # Время до первого байта копится для всех провайдеров, и с гонкой и без
+    def __init__(self, log):
+        self.log = log
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._hedged = 0
+
+    def race(self, make, provs: list, after: float) -> tuple:
+        # make(провайдер) -> объект TTS. Вернет (провайдер, итератор чанков) или бросит RuntimeError
+        race = _Race()
+        for idx, prov in enumerate(provs):
+            with race.cond:
+                if race.winner is not None:
+                    break
+                race.started += 1
+            if len(provs) == 1:  # Без гонки, в этом же потоке
+                self._run(race, make, prov)
+                break
+            if idx:
+                with self._lock:
+                    self._hedged += 1
+                with race.cond:
+                    why = 'упал' if race.failed else 'молчит {} сек'.format(after)
+                self.log('{} {}, запрашиваю {}'.format(provs[idx - 1], why, prov), logger.DEBUG)
+            threading.Thread(target=self._run, args=(race, make, prov), name='TTSHedge', daemon=True).start()
+            with race.cond:
+                race.cond.wait_for(race.over, timeout=after if idx < len(provs) - 1 else None)
+        with race.cond:
+            race.cond.wait_for(race.over)
+            if race.winner is None:
+                raise RuntimeError('; '.join(race.failed))
+            return race.winner
+
+    def stats(self) -> dict:
+        # {hedged, провайдер: {wins, losses, errors, ttfb_avg, ttfb_max}}
+        with self._lock:
+            result = {'hedged': self._hedged}
+            for prov, val in self._stats.items():
+                data = {key: val[key] for key in ('wins', 'losses', 'errors')}
+                data['ttfb_avg'] = round(val['ttfb'] / val['count'], 3) if val['count'] else 0
+                data['ttfb_max'] = round(val['ttfb_max'], 3)
+                result[prov] = data
+        return result
+
+    def _stat(self, prov: str, name: str, ttfb: float = None):
+        with self._lock:
+            if prov not in self._stats:
+                self._stats[prov] = {'wins': 0, 'losses': 0, 'errors': 0, 'count': 0, 'ttfb': 0, 'ttfb_max': 0}
+            data = self._stats[prov]
+            data[name] += 1
+            if ttfb is not None:
+                data['count'] += 1
+                data['ttfb'] += ttfb
+                data['ttfb_max'] = max(data['ttfb_max'], ttfb)
+
+    def _run(self, race: _Race, make, prov: str):
+        wtime = time.time()
+        try:
+            chunks = make(prov).iter_me()
+            first = next(chunks, None)
+            if first is None:
+                raise RuntimeError('Пустой ответ')
+        except Exception as e:
+            self._stat(prov, 'errors')
+            race.fail(prov, e)
+            return
+        ttfb = time.time() - wtime
+        if race.win(prov, _joined(first, chunks)):
+            self._stat(prov, 'wins', ttfb)
+        else:
+            chunks.close()  # Опоздал, соединение или процесс закроется
+            self._stat(prov, 'losses', ttfb)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import heapq
+import threading
+
+import logger
+
+# Приоритеты синтеза, меньше - важнее
+INTERACTIVE = 0  # Ответ который ждут прямо сейчас
+LOW = 1  # Фраза из очереди низкого приоритета, играет следующей
+PREFETCH = 2  # Следующие фразы из очереди
+PREWARM = 3  # Прогрев кэша
+
+
+class TTSPool:
+    # Синтез речи в фиксированном числе потоков с приоритетной очередью.
+    # Фоновые задачи (PREFETCH и ниже) не принимаются если очередь переполнена.
+    # Все, кроме INTERACTIVE, занимают не больше WORKERS - 1 потоков: один всегда свободен для ответа
+    WORKERS = 3
+    QUEUE_SIZE = 20
+
+    def __init__(self, log):
+        self.log = log
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = 0
+        self._running = 0
+        self._background = 0  # Сколько потоков заняты не INTERACTIVE задачами
+        self._work = True
+        self._stats = {'submitted': 0, 'rejected': 0, 'cancelled': 0, 'done': 0, 'errors': 0, 'max_queue': 0}
+        self._threads = [
+            threading.Thread(target=self._worker, name='TTSWorker-{}'.format(num)) for num in range(self.WORKERS)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._work = False
+            jobs = [job for _, _, job in self._heap]
+            self._heap.clear()
+            self._cond.notify_all()
+        for job in jobs:
+            job.cancel()
+            job.run()  # Отмененная задача только разбудит ожидающих
+        for thread in self._threads:
+            thread.join()
+
+    def accepts(self, priority: int) -> bool:
+        # Противодавление: фоновую работу не берем, пока очередь забита
+        with self._cond:
+            if self._work and (priority < PREFETCH or len(self._heap) < self.QUEUE_SIZE):
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def put(self, job, priority: int):
+        # job.run() выполнится в пуле, job.cancel() до этого отменит выполнение
+        with self._cond:
+            heapq.heappush(self._heap, (priority, self._seq, job))
+            self._seq += 1
+            self._stats['submitted'] += 1
+            self._stats['max_queue'] = max(self._stats['max_queue'], len(self._heap))
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = self._stats.copy()
+            stats['queue'] = len(self._heap)
+            stats['running'] = self._running
+            stats['running_background'] = self._background
+            by_priority = [0] * (PREWARM + 1)
+            for priority, _, _ in self._heap:
+                by_priority[min(priority, PREWARM)] += 1
+        stats.update({'queue_interactive': by_priority[INTERACTIVE], 'queue_low': by_priority[LOW],
+                      'queue_prefetch': by_priority[PREFETCH], 'queue_prewarm': by_priority[PREWARM]})
+        return stats
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while self._work and not self._ready():
+                    self._cond.wait()
+                if not self._work:
+                    return
+                priority, _, job = heapq.heappop(self._heap)
+                background = priority > INTERACTIVE
+                self._running += 1
+                self._background += background
+            key = 'cancelled' if job.cancelled else 'done'
+            try:
+                job.run()
+            except Exception as e:
+                key = 'errors'
+                self.log('Ошибка в потоке синтеза: {}'.format(e), logger.CRIT)
+            with self._cond:
+                self._running -= 1
+                self._stats[key] += 1
+                if background:
+                    self._background -= 1
+                    self._cond.notify_all()  # Фоновая задача в очереди могла ждать свободный поток
+
+    def _ready(self) -> bool:
+        # Вызывать под локом
+        return bool(self._heap) and (self._heap[0][0] <= INTERACTIVE or self._background < self.WORKERS - 1)
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 
+import ast
 import os
 import queue
+import re
 import signal
 import socket
+import string
 import subprocess
 import threading
 import time
@@ -160,3 +163,102 @@ def pretty_size(size) -> str:
 
 def write_permission_check(path):
     return os.access(os.path.dirname(os.path.abspath(path)), os.W_OK)
+
+
+def say_literals(path: str) -> list:
+    # Строки-константы из вызовов say(...), Say(...) и Ask(...) в файле, без его импорта
+    try:
+        with open(path, encoding='utf8') as fp:
+            tree = ast.parse(fp.read(), path)
+    except (OSError, SyntaxError, UnicodeDecodeError):
+        return []
+    result = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or not node.args:
+            continue
+        if isinstance(node.func, ast.Attribute):
+            name = node.func.attr
+        elif isinstance(node.func, ast.Name):
+            name = node.func.id
+        else:
+            continue
+        if name not in ('say', 'Say', 'Ask', 'Template'):
+            continue
+        try:
+            value = ast.literal_eval(node.args[0])
+        except ValueError:
+            continue
+        if not isinstance(value, str) or not value:
+            continue
+        for text in Template.statics(value) if name == 'Template' else [value]:
+            if text not in result:
+                result.append(text)
+    return result
+
+
+class Template(str):
+    # Фраза по шаблону: Template('Модель номер {} готова', 3). Для всего остального это обычная строка,
+    # а tts синтезирует неизменные куски и подстановки отдельно и склеивает звук.
+    # segments - [(текст, неизменный кусок)], знаки препинания без слов приклеены к соседнему куску
+    def __new__(cls, fmt: str, *args, **kwargs):
+        segments = []
+        auto = 0
+        for literal, field, spec, conversion in string.Formatter().parse(fmt):
+            if literal:
+                segments.append([literal, True])
+            if field is None:
+                continue
+            if field == '':
+                field, auto = auto, auto + 1
+            value = args[int(field)] if isinstance(field, int) or field.isdigit() else kwargs[field]
+            value = repr(value) if conversion == 'r' else value
+            segments.append([format(value, spec or ''), False])
+        obj = super().__new__(cls, ''.join(text for text, _ in segments))
+        obj.segments = cls._glue(segments)
+        return obj
+
+    @staticmethod
+    def _glue(segments: list) -> list:
+        result = []
+        for text, static in segments:
+            if not re.search(r'\w', text) and result:
+                result[-1][0] += text
+            elif result and not re.search(r'\w', result[-1][0]):
+                result[-1] = [result[-1][0] + text, static]
+            else:
+                result.append([text, static])
+        return [(text, static) for text, static in result]
+
+    @classmethod
+    def statics(cls, fmt: str) -> list:
+        # Неизменные куски шаблона, для прогрева кэша
+        fields = [field for _, field, _, _ in string.Formatter().parse(fmt) if field is not None]
+        names = {field: 'x' for field in fields if field and not field.isdigit()}
+        count = max([int(x) + 1 for x in fields if x.isdigit()] + [len([x for x in fields if x == ''])])
+        try:
+            return [text.strip() for text, static in cls(fmt, *['x'] * count, **names).segments if static]
+        except (IndexError, KeyError, ValueError):
+            return []
+
+
+def normalize_phrase(msg: str, rules: str) -> str:
+    # Приводит фразу к одному виду перед кэшем и синтезом. rules - через запятую:
+    # space - лишние пробелы, punct - повторы и хвостовые знаки, которые не слышно (кроме точки сокращений),
+    # case - слова с заглавной буквы (аббревиатуры не трогает), yo - ё в е (все/всё звучат по-разному)
+    rules = {x.strip() for x in rules.split(',')}
+    result = msg
+    if 'space' in rules:
+        result = re.sub(r'\s+([,.!?;:…])', r'\1', ' '.join(result.split()))
+    if 'punct' in rules:
+        result = re.sub(r'([!?,;:])\1+', r'\1', result)
+        # Точку после коротких слов не трогаем: сокращения (1799 г., и т. д.) читаются иначе
+        result = re.sub(r'(?:\s*[,;:\-–—]+|(?<=[^\W\d_]{3})\.)$', '', result).rstrip()
+    if 'case' in rules:
+        result = re.sub(
+            r'\b([^\W\d_])([^\W\d_]*)\b',
+            lambda m: m.group(1).lower() + m.group(2) if not m.group(2) or m.group(2).islower() else m.group(0),
+            result
+        )
+    if 'yo' in rules:
+        result = result.replace('ё', 'е').replace('Ё', 'Е')
+    return result or msg